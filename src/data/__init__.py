@@ -1 +1,3 @@
-from data.helpers.make_full_dataset import make_full_dataset
\ No newline at end of file
+from data.helpers.make_full_dataset import make_full_dataset, get_cleaned_data, read_dataset_csv
+from data.helpers.shared_base_datasets import SharedBaseDatasets
+from data.helpers.dataset_store import save_datasets_to_store, load_datasets
\ No newline at end of file
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 
 from sklearn.model_selection import train_test_split
 
@@ -10,6 +11,7 @@ currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentfram
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 import util, data, features
+from data.helpers import column_catalog
 
 def build_output_dir_name(first_assessment_to_drop, use_other_diags_as_input, only_free_assessments):
     # Part with the datetime
@@ -55,87 +57,76 @@ def customize_input_cols_per_diag(input_cols, diag):
     
     return input_cols
 
-def get_input_cols_per_diag(full_dataset, diag, use_other_diags_as_input):
-    
+def get_base_input_cols(full_dataset, use_other_diags_as_input):
+    # Input columns that don't depend on the diagnosis, computed once for all diagnoses
     if use_other_diags_as_input == 1:
-        input_cols = [x for x in full_dataset.columns if 
+        base_input_cols = [x for x in full_dataset.columns if 
                         not x.startswith("WIAT")
                         and not x.startswith("WISC")
                         and not x == "ASSQ,ASSQ_Total"
                         and not x == "CBCL,CBCL_SP_T"
                         and not (x.startswith("NIH") and x.endswith("_P"))
-                        and not x == "Diag.No Diagnosis Given"
-                        and not x == get_cons_diag_col_name_from_new_diag(diag)
-                        and not x == diag]
+                        and not x == "Diag.No Diagnosis Given"]
     else:
-        input_cols = [x for x in full_dataset.columns if 
+        base_input_cols = [x for x in full_dataset.columns if 
                         not x.startswith("WIAT")
                         and not x.startswith("WISC")
                         and not x == "ASSQ,ASSQ_Total"
                         and not x == "CBCL,CBCL_SP_T"
                         and not (x.startswith("NIH") and x.endswith("P"))
                         and not x.startswith("New Diag.")
-                        and not x == get_cons_diag_col_name_from_new_diag(diag)
                         and not x.startswith("Diag.")]
+    return base_input_cols
+
+def get_input_cols_per_diag(base_input_cols, catalog, diag):
+    
+    # Only the output column and its consensus diagnosis column depend on the diagnosis
+    input_cols = [x for x in base_input_cols if x != diag and x != get_cons_diag_col_name_from_new_diag(diag)]
         
     # Remove NIH scores when predicting NVLD (used in definition)
     if diag == "New Diag.NVLD":
-        input_cols = [x for x in input_cols if not x.startswith("NIH")]
+        nih_cols = set(column_catalog.get_columns_of_assessments(catalog, [x for x in catalog["columns_by_assessment"] if x.startswith("NIH")]))
+        input_cols = [x for x in input_cols if x not in nih_cols]
 
     input_cols = customize_input_cols_per_diag(input_cols, diag)
-    print("Input assessemnts used: ", list(set([x.split(",")[0] for x in input_cols])))
+    print("Input assessemnts used: ", list(set([catalog["assessment"][x] for x in input_cols])))
     
     return input_cols
 
-def keep_only_healthy_controls(X, y):
+def keep_only_healthy_controls(rows, y, no_diag):
     # Remove people where y=0 and Diag.No Diagnosis Given is 0 (they have other diagnoses)
-    
-    # Get indices to remove
-    indices_to_remove = X[(y == 0) & (X["Diag.No Diagnosis Given"] == 0)].index
+    return rows[~((y[rows] == 0) & (no_diag[rows] == 0))]
 
-    # Remove rows
-    X_new = X.drop(indices_to_remove)
-    y_new = y.drop(indices_to_remove)
+def split_datasets_per_diag(full_dataset, diag_cols, split_percentage, use_other_diags_as_input):
+    # Full dataset is stored once, each diagnosis only gets row positions of its splits and positions of its input columns
+    datasets = data.SharedBaseDatasets(full_dataset)
 
-    return X_new, y_new
+    all_rows = np.arange(full_dataset.shape[0])
+    no_diag = full_dataset["Diag.No Diagnosis Given"].to_numpy()
+
+    catalog = column_catalog.build_column_catalog(full_dataset.columns)
+    base_input_cols = get_base_input_cols(full_dataset, use_other_diags_as_input)
 
-def split_datasets_per_diag(full_dataset, diag_cols, split_percentage, use_other_diags_as_input):
-    datasets = {}
     for diag in diag_cols:
         
-        output_col = diag
+        y = full_dataset[diag].to_numpy()
         
         # Split train, validation, and test sets
-        X_train, X_test, y_train, y_test = train_test_split(full_dataset, full_dataset[output_col], 
-                                                            test_size=split_percentage, stratify=full_dataset[output_col], 
-                                                            random_state=1)
-        X_train_train, X_val, y_train_train, y_val = train_test_split(X_train, y_train, test_size=split_percentage, 
-                                                                      stratify=y_train, random_state=1)
+        train_rows, test_rows = train_test_split(all_rows, test_size=split_percentage, stratify=y, random_state=1)
+        train_train_rows, val_rows = train_test_split(train_rows, test_size=split_percentage, stratify=y[train_rows], random_state=1)
         
-        X_test_only_healthy_controls, y_test_only_healthy_controls = keep_only_healthy_controls(X_test, y_test)
-        X_val_only_healthy_controls, y_val_only_healthy_controls = keep_only_healthy_controls(X_val, y_val)
+        rows_per_split = {"train": train_rows,
+                          "test": test_rows,
+                          "train_train": train_train_rows,
+                          "val": val_rows,
+                          "test_only_healthy_controls": keep_only_healthy_controls(test_rows, y, no_diag),
+                          "val_only_healthy_controls": keep_only_healthy_controls(val_rows, y, no_diag)}
 
         # Drop columns from input that we don't want there
-        input_cols = get_input_cols_per_diag(full_dataset, diag, use_other_diags_as_input)
-        X_train = X_train[input_cols]
-        X_test = X_test[input_cols]
-        X_train_train = X_train_train[input_cols]
-        X_val = X_val[input_cols]
-        X_test_only_healthy_controls = X_test_only_healthy_controls[input_cols]
-        X_val_only_healthy_controls = X_val_only_healthy_controls[input_cols]
+        input_cols = get_input_cols_per_diag(base_input_cols, catalog, diag)
+        input_col_positions = full_dataset.columns.get_indexer(input_cols)
     
-        datasets[diag] = { "X_train": X_train,
-                        "X_test": X_test,
-                        "y_train": y_train,
-                        "y_test": y_test,
-                        "X_train_train": X_train_train,
-                        "X_val": X_val,
-                        "y_train_train": y_train_train,
-                        "y_val": y_val,
-                        "X_test_only_healthy_controls": X_test_only_healthy_controls,
-                        "y_test_only_healthy_controls": y_test_only_healthy_controls,
-                        "X_val_only_healthy_controls": X_val_only_healthy_controls,
-                        "y_val_only_healthy_controls": y_val_only_healthy_controls}
+        datasets.add_diag(diag, rows_per_split, input_col_positions)
         
     return datasets
 
@@ -169,17 +160,17 @@ def save_dataset_stats(datasets, diag_cols, full_dataset, dir):
     stats_df.columns = ["Value"]
     stats_df.to_csv(dir + "dataset_stats.csv")
 
-def main(only_assessment_distribution, first_assessment_to_drop, use_other_diags_as_input, only_free_assessments):
+def main(only_assessment_distribution, first_assessment_to_drop, use_other_diags_as_input, only_free_assessments, full_wo_underscore=None):
     only_assessment_distribution = int(only_assessment_distribution)
     use_other_diags_as_input = int(use_other_diags_as_input)
     only_free_assessments = int(only_free_assessments)
 
     dirs = set_up_directories(first_assessment_to_drop, use_other_diags_as_input, only_free_assessments)
 
-    data.make_full_dataset(only_assessment_distribution, first_assessment_to_drop, only_free_assessments, dirs)
+    data.make_full_dataset(only_assessment_distribution, first_assessment_to_drop, only_free_assessments, dirs, full_wo_underscore)
 
     if only_assessment_distribution == 0:
-        full_dataset = pd.read_csv(dirs["data_output_dir"] + "item_lvl.csv")
+        full_dataset = data.read_dataset_csv(dirs["data_output_dir"] + "item_lvl.csv")
         full_dataset = features.make_new_diag_cols(full_dataset)
 
         # Print dataset shape
@@ -203,6 +194,7 @@ def main(only_assessment_distribution, first_assessment_to_drop, use_other_diags
         save_dataset_stats(datasets, diag_cols, full_dataset, dirs["data_statistics_dir"])
             
         dump(datasets, dirs["data_output_dir"]+'datasets.joblib', compress=1)
+        data.save_datasets_to_store(datasets, dirs["data_output_dir"])
 
         # Save number of positive examples for each diagnosis to csv (convert dict to df)
         pos_examples_col_name = f"Positive examples out of {full_dataset.shape[0]}"
@@ -0,0 +1,25 @@
+from joblib import Parallel, delayed
+import sys, os, inspect
+
+# To import from parent directory
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+import data
+import create_datasets
+
+# Make datasets for several first_assessment_to_drop values (e.g. "ICU_P,SCARED_SR,CPIC"): data is read and cleaned once, 
+#   then each cutoff runs create_datasets.py in a separate process, with the same output directories as create_datasets.py
+
+def main(first_assessments_to_drop, use_other_diags_as_input, only_free_assessments, n_jobs = -1):
+    first_assessments_to_drop = first_assessments_to_drop.split(",")
+    n_jobs = int(n_jobs)
+
+    full_wo_underscore = data.get_cleaned_data()
+
+    Parallel(n_jobs=n_jobs)(
+        delayed(create_datasets.main)(0, first_assessment_to_drop, use_other_diags_as_input, only_free_assessments, full_wo_underscore) 
+        for first_assessment_to_drop in first_assessments_to_drop)
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,141 @@
+# Column catalog: built once from column names, maps assessments to their columns, each column to its kind 
+#   (id, admin, total, subscale, missing_marker, ...) and position, and columns to their missingness markers, so 
+#   selecting columns doesn't need scans over all columns.
+#   Catalogs are memoised on the column names and shared between callers, so they are read-only (mappings and tuples).
+import functools
+from types import MappingProxyType
+
+ADMIN_COL_SUBSTRINGS = ["Administration", "Data_entry", "Days_Baseline", "START_DATE", "Season", "Site", "Study", "Year", "Commercial_Use", "Release_Number"]
+
+MISSING_MARKER_SUFFIX = "_WAS_MISSING"
+
+TOTAL_SCORE_COLS_W_RAW = ["SCQ,SCQ_Total", 
+                    "Barratt,Barratt_Total", 
+                    #"ASSQ,ASSQ_Total", # Need for NVLD prediction, don't forget to exclude from input vars in create_datasets.py
+                    "ARI_P,ARI_P_Total_Score", 
+                    "SWAN,SWAN_Total",
+                    "SRS,SRS_Total", 
+                    "SRS,SRS_Total_T", 
+                    "CBCL,CBCL_Total",
+                    "CBCL,CBCL_Total_T",
+                    "ICU_P,ICU_P_Total",
+                    "ICU_SR,ICU_SR_Total",
+                    "APQ_P,APQ_P_Total",
+                    "PCIAT,PCIAT_Total",
+                    "DTS,DTS_Total",
+                    "MFQ_P,MFQ_P_Total",
+                    "APQ_SR,APQ_SR_Total",
+                    "WHODAS_P,WHODAS_P_Total", 
+                    "CIS_P,CIS_P_Score", 
+                    "PSI,PSI_Total",
+                    "PSI,PSI_Total_T",
+                    "RBS,RBS_Total",
+                    "SCARED_P,SCARED_P_Total",
+                    "SCARED_SR,SCARED_SR_Total",
+                    "WHODAS_SR,WHODAS_SR_Score", 
+                    "CIS_SR,CIS_SR_Total", 
+                    # "C3SR,C3SR_Total", # Doesn't have a total
+                    # "CCSC,CCSC_Total",  # Doesn't have a total
+                    # "CPIC,CPIC_Total", # Doesn't have a total
+                    "YSR,YSR_Total",
+                    "YSR,YSR_Total_T",
+                    "CBCL_Pre,CBCL_Pre_Total",
+                    "CBCL_Pre,CBCL_Pre_Total_T",
+                    "SRS_Pre,SRS_Pre_Total",
+                    "SRS_Pre,SRS_Pre_Total_T",
+                    "ASR,ASR_Total",
+                    "ASR,ASR_Total_T",
+                ]
+
+SUBSCALE_SCORE_COLS_W_RAW = ["Barratt,Barratt_Total_Edu", "Barratt,Barratt_Total_Occ",
+                    "SWAN,SWAN_HY", "SWAN,SWAN_IN",
+                    "SRS,SRS_AWR_T", "SRS,SRS_AWR", "SRS,SRS_COG_T", "SRS,SRS_COG", "SRS,SRS_COM_T", "SRS,SRS_COM", "SRS,SRS_DSMRRB_T", "SRS,SRS_DSMRRB", "SRS,SRS_MOT_T", "SRS,SRS_MOT", "SRS,SRS_RRB_T", "SRS,SRS_RRB", "SRS,SRS_SCI_T", "SRS,SRS_SCI",
+                    "CBCL,CBCL_AB_T", "CBCL,CBCL_AB", "CBCL,CBCL_AD_T", "CBCL,CBCL_AD", "CBCL,CBCL_AP_T", "CBCL,CBCL_AP", "CBCL,CBCL_Ext_T", "CBCL,CBCL_Ext", "CBCL,CBCL_Int_T", "CBCL,CBCL_Int", "CBCL,CBCL_RBB_T", "CBCL,CBCL_RBB", "CBCL,CBCL_SC_T", "CBCL,CBCL_SC", 
+                    # "CBCL,CBCL_SP_T",  Need for NVLD prediction, don't forget to exclude from input vars in create_datasets.py
+                    "CBCL,CBCL_SP", "CBCL,CBCL_TP_T", "CBCL,CBCL_TP", "CBCL,CBCL_WD_T", "CBCL,CBCL_WD", "CBCL,CBCL_C", "CBCL,CBCL_OP",
+                    "ICU_P,ICU_P_Callous", "ICU_P,ICU_P_Uncaring", "ICU_P,ICU_P_Unemotional",
+                    "ICU_SR,ICU_SR_Callous", "ICU_SR,ICU_SR_Uncaring", "ICU_SR,ICU_SR_Unemotional",
+                    "PANAS_PositiveAffect", "PANAS_NegativeAffect",
+                    "APQ_P,APQ_P_CP", "APQ_P,APQ_P_ID", "APQ_P,APQ_P_INV", "APQ_P,APQ_P_OPD", "APQ_P,APQ_P_PM", "APQ_P,APQ_P_PP",
+                    "DTS,DTS_absorption", "DTS,DTS_appraisal", "DTS,DTS_regulation", "DTS,DTS_tolerance",
+                    "APQ_SR,APQ_SR_CP", "APQ_SR,APQ_SR_ID", "APQ_SR,APQ_SR_INV_D", "APQ_SR,APQ_SR_INV_M", "APQ_SR,APQ_SR_OPD", "APQ_SR,APQ_SR_PM", "APQ_SR,APQ_SR_PP",
+                    "PSI,PSI_DC_T", "PSI,PSI_DC", "PSI,PSI_PCDI_T", "PSI,PSI_PCDI", "PSI,PSI_PD_T", "PSI,PSI_PD",
+                    "RBS,RBS_Score_01", "RBS,RBS_Score_02", "RBS,RBS_Score_03", "RBS,RBS_Score_04", "RBS,RBS_Score_05",  
+                    "SCARED_P,SCARED_P_GD", "SCARED_P,SCARED_P_PN", "SCARED_P,SCARED_P_SC", "SCARED_P,SCARED_P_SH", "SCARED_P,SCARED_P_SP",
+                    "SCARED_SR,SCARED_SR_GD", "SCARED_SR,SCARED_SR_PN", "SCARED_SR,SCARED_SR_SC", "SCARED_SR,SCARED_SR_SH", "SCARED_SR,SCARED_SR_SP",
+                    "C3SR,C3SR_AG", "C3SR,C3SR_AG_T", "C3SR,C3SR_FR", "C3SR,C3SR_FR_T", "C3SR,C3SR_HY", "C3SR,C3SR_HY_T", "C3SR,C3SR_IN", "C3SR,C3SR_IN_T", "C3SR,C3SR_LP", "C3SR,C3SR_LP_T", "C3SR,C3SR_NI", "C3SR,C3SR_PI",
+                    "CCSC,CCSC_PFC", "CCSC,CCSC_CDM", "CCSC,CCSC_DPS", "CCSC,CCSC_SU", "CCSC,CCSC_AC", "CCSC,CCSC_AA", "CCSC,CCSC_REP", "CCSC,CCSC_WT", "CCSC,CCSC_PCR", "CCSC,CCSC_CON", "CCSC,CCSC_OPT", "CCSC,CCSC_POS", "CCSC,CCSC_REL", "CCSC,CCSC_SS", "CCSC,CCSC_SUPMF", "CCSC,CCSC_SUPOA", "CCSC,CCSC_SUPEER", "CCSC,CCSC_SUPSIB",
+                    "CPIC,CPIC_Frequency_Total", "CPIC,CPIC_Intensity_Total", "CPIC,CPIC_Resolution_Total", "CPIC,CPIC_Content_Total", "CPIC,CPIC_Perceived_Threat_Total", "CPIC,CPIC_Self_Blame_Total", "CPIC,CPIC_Triangulation_Total", "CPIC,CPIC_Stability_Total",
+                    "YSR,YSR_AB", "YSR,YSR_AB_T", "YSR,YSR_AD", "YSR,YSR_AD_T", "YSR,YSR_AP", "YSR,YSR_AP_T", "YSR,YSR_WD", "YSR,YSR_WD_T", "YSR,YSR_RBB", "YSR,YSR_RBB_T", "YSR,YSR_SC", "YSR,YSR_SC_T", "YSR,YSR_SP", "YSR,YSR_SP_T", "YSR,YSR_TP", "YSR,YSR_TP_T", "YSR,YSR_Ext", "YSR,YSR_Ext_T", "YSR,YSR_Int", "YSR,YSR_Int_T", "YSR,YSR_OP", "YSR,YSR_C", "YSR,YSR_Total", "YSR,YSR_Total_T",
+                    "CBCL_Pre,CBCL_Pre_AB", "CBCL_Pre,CBCL_Pre_AB_T", "CBCL_Pre,CBCL_Pre_AD", "CBCL_Pre,CBCL_Pre_AD_T", "CBCL_Pre,CBCL_Pre_AP", "CBCL_Pre,CBCL_Pre_AP_T", "CBCL_Pre,CBCL_Pre_SC", "CBCL_Pre,CBCL_Pre_SC_T", "CBCL_Pre,CBCL_Pre_SP", "CBCL_Pre,CBCL_Pre_SP_T", "CBCL_Pre,CBCL_Pre_WD", "CBCL_Pre,CBCL_Pre_WD_T", "CBCL_Pre,CBCL_Pre_Ext", "CBCL_Pre,CBCL_Pre_Ext_T", "CBCL_Pre,CBCL_Pre_Int", "CBCL_Pre,CBCL_Pre_Int_T", "CBCL_Pre,CBCL_Pre_DSM_ADHP", "CBCL_Pre,CBCL_Pre_DSM_ADHP_T", "CBCL_Pre,CBCL_Pre_DSM_AnxP", "CBCL_Pre,CBCL_Pre_DSM_AnxP_T", "CBCL_Pre,CBCL_Pre_DSM_AP", "CBCL_Pre,CBCL_Pre_DSM_AP_T", "CBCL_Pre,CBCL_Pre_DSM_ODP", "CBCL_Pre,CBCL_Pre_DSM_ODP_T", "CBCL_Pre,CBCL_Pre_DSM_PDP", "CBCL_Pre,CBCL_Pre_DSM_PDP_T", "CBCL_Pre,CBCL_Pre_OP", "CBCL_Pre,CBCL_Pre_Total", "CBCL_Pre,CBCL_Pre_Total_T",
+                    "SRS_Pre,SRS_Pre_AWR_T", "SRS_Pre,SRS_Pre_AWR", "SRS_Pre,SRS_Pre_COG_T", "SRS_Pre,SRS_Pre_COG", "SRS_Pre,SRS_Pre_COM_T", "SRS_Pre,SRS_Pre_COM", "SRS_Pre,SRS_Pre_DSMRRB_T", "SRS_Pre,SRS_Pre_DSMRRB", "SRS_Pre,SRS_Pre_MOT_T", "SRS_Pre,SRS_Pre_MOT", "SRS_Pre,SRS_Pre_RRB_T", "SRS_Pre,SRS_Pre_RRB", "SRS_Pre,SRS_Pre_SCI_T", "SRS,SRS_Pre_SCI",
+                    "ASR,ASR_AD", "ASR,ASR_AD_T", "ASR,ASR_WD", "ASR,ASR_WD_T", "ASR,ASR_SC", "ASR,ASR_SC_T", "ASR,ASR_TP", "ASR,ASR_TP_T", "ASR,ASR_AP", "ASR,ASR_AP_T", "ASR,ASR_RBB", "ASR,ASR_RBB_T", "ASR,ASR_AB", "ASR,ASR_AB_T", "ASR,ASR_OP", "ASR,ASR_Int", "ASR,ASR_Int_T", "ASR,ASR_Ext", "ASR,ASR_Ext_T", "ASR,ASR_Intrusive", "ASR,ASR_Intrusive_T", "ASR,ASR_C", 
+                    ]
+
+TOTAL_SCORE_RAW_COLS = [x.strip("_T") for x in TOTAL_SCORE_COLS_W_RAW if x.endswith("_T")]
+SUBSCALE_SCORE_RAW_COLS = [x.strip("_T") for x in SUBSCALE_SCORE_COLS_W_RAW if x.endswith("_T")]
+
+TOTAL_SCORE_COLS_W_RAW_SET = set(TOTAL_SCORE_COLS_W_RAW)
+SUBSCALE_SCORE_COLS_W_RAW_SET = set(SUBSCALE_SCORE_COLS_W_RAW)
+
+def get_assessment_of_col(col):
+    return col.split(",")[0]
+
+def get_kind_of_col(col):
+    if any(substring in col for substring in ADMIN_COL_SUBSTRINGS):
+        return "admin"
+    if col == "ID" or ",EID" in col or get_assessment_of_col(col) == "Identifiers":
+        return "id"
+    if col in TOTAL_SCORE_COLS_W_RAW_SET:
+        return "total"
+    if col in SUBSCALE_SCORE_COLS_W_RAW_SET:
+        return "subscale"
+    if col.endswith(MISSING_MARKER_SUFFIX):
+        return "missing_marker"
+    if col.startswith("New Diag."):
+        return "new_diag"
+    if col.startswith("Diag."):
+        return "diag"
+    if get_assessment_of_col(col) == "Diagnosis_ClinicianConsensus":
+        return "consensus_diag"
+    return "item"
+
+def get_original_of_missing_marker(marker):
+    return marker[:-len(MISSING_MARKER_SUFFIX)]
+
+def freeze_catalog(catalog):
+    frozen = {}
+    for key, mapping in catalog.items():
+        frozen[key] = MappingProxyType({k: tuple(v) if isinstance(v, list) else v for k, v in mapping.items()})
+    return MappingProxyType(frozen)
+
+@functools.lru_cache(maxsize=8)
+def build_column_catalog_of_names(columns):
+    catalog = {"assessment": {}, "kind": {}, "position": {}, "columns_by_assessment": {}, "columns_by_kind": {}, "missing_marker": {}}
+    for position, col in enumerate(columns):
+        assessment = get_assessment_of_col(col)
+        kind = get_kind_of_col(col)
+        catalog["assessment"][col] = assessment
+        catalog["kind"][col] = kind
+        catalog["position"][col] = position
+        catalog["columns_by_assessment"].setdefault(assessment, []).append(col)
+        catalog["columns_by_kind"].setdefault(kind, []).append(col)
+        if col.endswith(MISSING_MARKER_SUFFIX):
+            # Original column -> its marker, also for originals dropped after the marker was added
+            catalog["missing_marker"][get_original_of_missing_marker(col)] = col
+    return freeze_catalog(catalog)
+
+def build_column_catalog(columns):
+    return build_column_catalog_of_names(tuple(columns))
+
+def get_columns_of_assessments(catalog, assessments):
+    columns = []
+    for assessment in assessments:
+        columns.extend(catalog["columns_by_assessment"].get(assessment, []))
+    return columns
+
+def get_columns_of_kinds(catalog, kinds):
+    columns = []
+    for kind in kinds:
+        columns.extend(catalog["columns_by_kind"].get(kind, []))
+    return columns
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from joblib import load
+import os, inspect, json
+import sys
+
+# To import from parent directory
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+import util
+from data.helpers.shared_base_datasets import DATASET_KEYS
+
+# Datasets store: per diagnosis and split, one uncompressed .npy file per dtype of the columns (+ one with the row index), 
+#   and a small manifest with the columns and dtypes. Files are memory mapped on access, so only the diagnoses and splits 
+#   that are used are read from disk. Columns are stored in their own dtype and column-major, so each column of a loaded 
+#   DataFrame is a view of the memory map (no copy, no dtype conversion). Only nullable (extension) dtype columns, 
+#   which datasets made by make_full_dataset.py don't have any more, are stored as float64 and converted on load.
+STORE_DIR_NAME = "datasets/"
+MANIFEST_FILE_NAME = "manifest.json"
+STORE_FORMAT_VERSION = 2 # Stores of another version are not read (load_datasets falls back to datasets.joblib)
+
+def get_stored_dtype(dtype):
+    # Dtype of the array a column is stored in: its own dtype, float64 with NaN for missing values for nullable dtypes
+    dtype = pd.api.types.pandas_dtype(dtype)
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return np.dtype(np.float64)
+    return dtype
+
+def get_columns_by_stored_dtype(columns, dtypes):
+    # Columns stored in each array, in column order
+    columns_by_stored_dtype = {}
+    for col, dtype in zip(columns, dtypes):
+        columns_by_stored_dtype.setdefault(get_stored_dtype(dtype).name, []).append(col)
+    return columns_by_stored_dtype
+
+def get_values_path(diag_dir, key, stored_dtype_name):
+    return diag_dir + key + "_" + stored_dtype_name + ".npy"
+
+def get_stored_values(dataset, stored_dtype):
+    # Missing values of nullable columns as NaN (only float64 arrays have nullable columns)
+    if stored_dtype == np.float64:
+        return dataset.to_numpy(dtype=stored_dtype, na_value=np.nan)
+    return dataset.to_numpy(dtype=stored_dtype)
+
+def save_values(diag_dir, key, dataset):
+    if isinstance(dataset, pd.DataFrame):
+        for stored_dtype_name, cols in get_columns_by_stored_dtype(dataset.columns, dataset.dtypes).items():
+            values = get_stored_values(dataset[cols], np.dtype(stored_dtype_name))
+            np.save(get_values_path(diag_dir, key, stored_dtype_name), np.asfortranarray(values))
+    else:
+        stored_dtype = get_stored_dtype(dataset.dtype)
+        np.save(get_values_path(diag_dir, key, stored_dtype.name), get_stored_values(dataset, stored_dtype))
+    np.save(diag_dir + key + "_index.npy", dataset.index.to_numpy())
+
+def save_datasets_to_store(datasets, output_dir):
+    store_dir = output_dir + STORE_DIR_NAME
+    util.create_dir_if_not_exists(store_dir)
+
+    manifest = {"format_version": STORE_FORMAT_VERSION, "diags": {}}
+    for diag in datasets:
+        diag_dir_name = util.remove_chars_forbidden_in_file_names(diag) + "/"
+        util.create_dir_if_not_exists(store_dir + diag_dir_name)
+
+        for key in DATASET_KEYS:
+            save_values(store_dir + diag_dir_name, key, datasets[diag][key])
+
+        X, y = datasets[diag]["X_train"], datasets[diag]["y_train"]
+        manifest["diags"][diag] = {
+            "dir": diag_dir_name,
+            "columns": list(X.columns),
+            "dtypes": [str(dtype) for dtype in X.dtypes],
+            "y_name": y.name,
+            "y_dtype": str(y.dtype)
+        }
+
+    with open(store_dir + MANIFEST_FILE_NAME, "w") as file:
+        file.write(json.dumps(manifest, indent=2))
+
+class StoredDiagDataset(Mapping):
+    # Datasets of one diagnosis from the store, datasets[diag]["X_val"] reads (memory maps) only that split
+    def __init__(self, diag_dir, diag_manifest):
+        self.diag_dir = diag_dir
+        self.diag_manifest = diag_manifest
+
+    def load_values(self, key, stored_dtype_name):
+        return np.asarray(np.load(get_values_path(self.diag_dir, key, stored_dtype_name), mmap_mode="r")) # Plain ndarray view of the memory map
+
+    def __getitem__(self, key):
+        if key not in DATASET_KEYS:
+            raise KeyError(key)
+        index = np.load(self.diag_dir + key + "_index.npy")
+        if key.startswith("X_"):
+            columns, dtypes = self.diag_manifest["columns"], self.diag_manifest["dtypes"]
+            column_values = {}
+            for stored_dtype_name, cols in get_columns_by_stored_dtype(columns, dtypes).items():
+                values = self.load_values(key, stored_dtype_name)
+                for i, col in enumerate(cols):
+                    column_values[col] = values[:, i] # Contiguous (column-major file)
+            # copy=False: pandas 3 copies arrays by default
+            dataset = pd.DataFrame({col: column_values[col] for col in columns}, index=index, copy=False)
+            cols_to_convert = {col: dtype for col, dtype in zip(columns, dtypes) if str(dataset[col].dtype) != dtype}
+            if cols_to_convert:
+                dataset = dataset.astype(cols_to_convert)
+        else:
+            y_dtype = self.diag_manifest["y_dtype"]
+            dataset = pd.Series(self.load_values(key, get_stored_dtype(y_dtype).name), index=index, name=self.diag_manifest["y_name"], copy=False)
+            if str(dataset.dtype) != y_dtype:
+                dataset = dataset.astype(y_dtype)
+        return dataset
+
+    def __iter__(self):
+        return iter(DATASET_KEYS)
+
+    def __len__(self):
+        return len(DATASET_KEYS)
+
+class StoredDatasets(Mapping):
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(store_dir + MANIFEST_FILE_NAME) as file:
+            self.manifest = json.load(file)
+
+    def __getitem__(self, diag):
+        diag_manifest = self.manifest["diags"][diag]
+        return StoredDiagDataset(self.store_dir + diag_manifest["dir"], diag_manifest)
+
+    def __iter__(self):
+        return iter(self.manifest["diags"])
+
+    def __len__(self):
+        return len(self.manifest["diags"])
+
+def is_store_readable(store_dir):
+    if not os.path.exists(store_dir + MANIFEST_FILE_NAME):
+        return False
+    with open(store_dir + MANIFEST_FILE_NAME) as file:
+        return json.load(file).get("format_version") == STORE_FORMAT_VERSION
+
+def load_datasets(data_dir):
+    # Use the datasets store if create_datasets.py saved one (in the current format), otherwise load datasets.joblib
+    if is_store_readable(data_dir + STORE_DIR_NAME):
+        return StoredDatasets(data_dir + STORE_DIR_NAME)
+    else:
+        return load(data_dir + 'datasets.joblib')
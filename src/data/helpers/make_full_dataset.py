@@ -6,7 +6,7 @@ import pandas as pd
 import numpy as np
 from collections import Counter
 from re import M
-import os, inspect
+import os, inspect, hashlib, json, warnings
 import matplotlib.pyplot as plt
 import sys
 
@@ -15,6 +15,44 @@ currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentfram
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 import util
+from data.helpers import column_catalog
+
+LORIS_RELEASE_PATH = "data/raw/LORIS-release-10.csv"
+LORIS_RELEASE_CHUNKSIZE = None # Number of rows to read at a time, for releases that don't fit in memory (None to read at once)
+
+CLEANED_DATA_CACHE_DIR = "data/interim/"
+CLEANING_CODE_VERSION = 3 # Increase when changing clean_loris_release() or read_loris_release(), to not use old cached data
+
+FLOAT32_EXACT_INT_LIMIT = 2**24 # Integers up to this absolute value are exact in float32
+
+def get_columns_to_read(all_columns, relevent_assessments_list):
+    # Columns of relevant assessments, EID columns of all assessments (used to get ID and to check if an assessment is filled), 
+    #   identifiers, and diagnosis columns
+    assessments_to_read = set(relevent_assessments_list + ["Identifiers", "Diagnosis_ClinicianConsensus"])
+    return [x for x in all_columns if x.split(",")[0] in assessments_to_read or ",EID" in x]
+
+def get_string_cols(columns):
+    # ID and diagnosis columns are kept as strings, the rest is parsed as numbers when the column is numeric
+    return [x for x in columns if ",EID" in x or x.split(",")[0] in ["Identifiers", "Diagnosis_ClinicianConsensus"]]
+
+def read_loris_release(path, relevent_assessments_list, chunksize=None):
+    # Yields the release in chunks of chunksize rows (one chunk with all rows if chunksize is None), 
+    #   row labels continue from chunk to chunk as in a read of the whole file
+    all_columns = pd.read_csv(path, nrows=0).columns
+    columns_to_read = get_columns_to_read(all_columns, relevent_assessments_list)
+
+    read_csv_params = {
+        "usecols": columns_to_read,
+        "dtype": {x: object for x in get_string_cols(columns_to_read)},
+        "na_values": ".", # Missing values are "."
+        "skiprows": [1], # First row doesn't have ID
+    }
+    
+    # Columns are in the order of the file (usecols doesn't change it), as in columns_to_read
+    if chunksize is None:
+        yield pd.read_csv(path, **read_csv_params)
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, **read_csv_params)
 
 def remove_proprietary_assessments(relevant_assessment_list):
     proprietary_assessments = ["ASR", "CBCL", "CBCL_Pre", "C3SR", "PCIAT", "RBS", "SCQ", "SRS", "SRS_Pre", "YSR", "Barratt", "PSI"]
@@ -34,17 +72,10 @@ def remove_irrelevant_nih_cols(full):
 
     return full
     
-def remove_admin_cols(full):
-    # Remove uninteresting columns
-    columns_to_drop = []
-
-    column_suffixes_to_drop = ["Administration", "Data_entry", "Days_Baseline", "START_DATE", "Season", "Site", "Study", "Year", "Commercial_Use", "Release_Number"]
-    for suffix in column_suffixes_to_drop:
-        cols_w_suffix = [x for x in full.columns if suffix in x]
-        columns_to_drop.extend(cols_w_suffix)
-
-    present_columns_to_drop = full.filter(columns_to_drop)
-    full = full.drop(present_columns_to_drop, axis = 1)
+def remove_admin_cols(full, catalog):
+    # Remove uninteresting columns (substrings to drop are in column_catalog.ADMIN_COL_SUBSTRINGS)
+    columns_to_drop = column_catalog.get_columns_of_kinds(catalog, ["admin"])
+    full = full.drop(columns_to_drop, axis = 1)
     return full 
 
 def get_ID_from_EID(full, EID_cols):
@@ -63,24 +94,22 @@ def get_ID_from_EID(full, EID_cols):
 
     return full
 
-# Drop rows with underscores in ID (NDARZZ007YMP_1, NDARAA075AMK_Visit_1)
-def drop_rows_w_underscore_in_id(full):
-
+# Rows with underscores in ID (NDARZZ007YMP_1, NDARAA075AMK_Visit_1) are dropped, and so are the questionnaires they have values in
+def get_questionnaires_in_rows_w_underscore_in_id(full):
     rows_with_underscore_in_id = full[full["ID"].str.contains("_")]
     non_empty_columns_in_underscore = rows_with_underscore_in_id.columns[
         ~rows_with_underscore_in_id.isna().all()
     ].tolist() 
-    non_empty_questionnaires_in_underscore = set([x.split(",")[0] for x in non_empty_columns_in_underscore])
-    
-    non_empty_questionnaires_in_underscore.remove("Identifiers")
-    non_empty_questionnaires_in_underscore.remove("ID")
-    full_wo_underscore = full[~full["ID"].str.contains("_")]
+    return set([x.split(",")[0] for x in non_empty_columns_in_underscore]) - {"Identifiers", "ID"}
 
-    # Drop questionnaires present in rows with underscores from data ({'DailyMeds', 'TRF', 'TRF_P', 'TRF_Pre'})
-    for questionnaire in non_empty_questionnaires_in_underscore:
-        full_wo_underscore = full_wo_underscore.drop(full_wo_underscore.filter(regex=(questionnaire+",")), axis=1)
+def drop_rows_w_underscore_in_id(full):
+    return full[~full["ID"].str.contains("_")]
 
-    return full_wo_underscore
+def drop_questionnaires_in_rows_w_underscore_in_id(full_wo_underscore, catalog, non_empty_questionnaires_in_underscore):
+    # Drop questionnaires present in rows with underscores from data ({'DailyMeds', 'TRF', 'TRF_P', 'TRF_Pre'})
+    #   (catalog can have columns already dropped, e.g. admin columns)
+    columns_to_drop = [x for x in column_catalog.get_columns_of_assessments(catalog, non_empty_questionnaires_in_underscore) if x in full_wo_underscore.columns]
+    return full_wo_underscore.drop(columns_to_drop, axis=1)
 
 def remove_incomplete_and_missing_diag(full_wo_underscore):
     full_wo_underscore = full_wo_underscore[full_wo_underscore["Diagnosis_ClinicianConsensus,DX_01"] != "No Diagnosis Given: Incomplete Eval"]
@@ -107,10 +136,18 @@ def get_relevant_id_cols_by_popularity(assessment_answer_counts, relevant_assess
 
 def get_cumul_number_of_examples_df(full_wo_underscore, EID_columns_by_popularity):
     cumul_number_of_examples_list = []
+
+    # Bool matrix of filled assessments, and ages as float array, to not go through the dataframe at each step
+    filled = full_wo_underscore[EID_columns_by_popularity].notnull().to_numpy()
+    ages = pd.to_numeric(full_wo_underscore["Basic_Demos,Age"], errors="coerce").to_numpy(dtype=float)
+
+    # Respondents who filled all top i assessments = respondents who filled all top i-1 assessments and the i-th one
+    filled_all_top_i = np.ones(filled.shape[0], dtype=bool)
     for i in range(1, len(EID_columns_by_popularity)+1):
         columns = EID_columns_by_popularity[0:i] # top i assessments
-        cumul_number_of_examples = full_wo_underscore[columns].notnull().all(axis=1).sum()
-        min_age_among_non_null = full_wo_underscore[full_wo_underscore[columns].notnull().all(axis=1)]["Basic_Demos,Age"].min()
+        filled_all_top_i &= filled[:, i-1]
+        cumul_number_of_examples = filled_all_top_i.sum()
+        min_age_among_non_null = pd.Series(ages[filled_all_top_i]).min()
         cumul_number_of_examples_list.append([cumul_number_of_examples, [x.split(",")[0] for x in columns], min_age_among_non_null])
     cumul_number_of_examples_df = pd.DataFrame(cumul_number_of_examples_list)
     cumul_number_of_examples_df.columns = ("Respondents", "Assessments", "Min Age")
@@ -130,13 +167,8 @@ def plot_comul_number_of_examples(cumul_number_of_examples_df, data_statistics_d
     plt.title("Cumulative Number of Respondents with Complete Data")
     plt.savefig(data_statistics_dir+'figures/cumul_assessment_distrib.png')  
 
-def get_columns_until_dropped(full_wo_underscore, EID_columns_until_dropped):
-    columns_until_dropped = []
-    assessments_until_dropped = [x.split(",")[0]+"," for x in EID_columns_until_dropped]
-    for assessment in assessments_until_dropped:
-        columns = [column for column in full_wo_underscore.columns if column.startswith(assessment)]
-        columns_until_dropped.extend(columns)
-    return columns_until_dropped
+def get_assessments_until_dropped(EID_columns_until_dropped):
+    return [column_catalog.get_assessment_of_col(x) for x in EID_columns_until_dropped]
 
 def get_data_up_to_dropped(full_wo_underscore, EID_columns_until_dropped, columns_until_dropped):
     diag_colunms = ["Diagnosis_ClinicianConsensus,DX_01", "Diagnosis_ClinicianConsensus,DX_02", "Diagnosis_ClinicianConsensus,DX_03", 
@@ -162,6 +194,28 @@ def convert_numeric_col_to_numeric_type(col):
     else:
         return col
 
+def is_float32_exact(values):
+    # Integer values (item answers, integer scores) small enough to be stored as float32 without losing precision 
+    #   (missing values too, as NaN)
+    values = values[~np.isnan(values)]
+    return bool(np.all(values % 1 == 0)) and (len(values) == 0 or np.abs(values).max() <= FLOAT32_EXACT_INT_LIMIT)
+
+def get_compact_dtypes(data_up_to_dropped):
+    # Flags (diagnosis columns, _WAS_MISSING markers) as uint8, integer valued columns (item answers, integer scores) as float32 
+    #   with NaN for missing values, both exact. Other numeric columns (e.g. age, scaled scores with decimals) stay float64.
+    #   No nullable (pd.NA) dtypes: mlxtend and sklearn imputers get object arrays from them
+    compact_dtypes = {}
+    for col, dtype in data_up_to_dropped.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            compact_dtypes[col] = "uint8"
+        elif pd.api.types.is_numeric_dtype(dtype) and is_float32_exact(data_up_to_dropped[col].to_numpy(dtype=np.float64)):
+            compact_dtypes[col] = "float32"
+        elif pd.api.types.is_numeric_dtype(dtype):
+            compact_dtypes[col] = "float64"
+        else:
+            compact_dtypes[col] = str(dtype)
+    return compact_dtypes
+
 def get_missing_values_df(data_up_to_dropped):
     missing_report_up_to_dropped = data_up_to_dropped.isna().sum().to_frame(name="Amount missing")
     missing_report_up_to_dropped["Persentage missing"] = missing_report_up_to_dropped["Amount missing"]/data_up_to_dropped["ID"].nunique() * 100
@@ -188,20 +242,32 @@ def remove_cols_w_missing_output_cols(data_up_to_dropped, cog_task_cols):
 def transform_dx_cols(data_up_to_dropped):
     og_diag_cols = [x for x in data_up_to_dropped.columns if "DX_" in x]
 
-    # Get list of diagnoses
-    diags = []
-    for col in og_diag_cols:
-        diags.extend(list(data_up_to_dropped[col].value_counts().index))
-    diags = list(set(diags))
-    diags.remove(' ')
-
-    # Make new columns
-    for diag in diags:
-        data_up_to_dropped["Diag." + util.remove_chars_forbidden_in_file_names(diag)] = (data_up_to_dropped[og_diag_cols] == diag).any(axis=1)
-        
+    # Encode all diagnosis strings in DX columns at once (codes[i, j] is the diagnosis code in row i, DX column j, -1 if missing)
+    dx_values = data_up_to_dropped[og_diag_cols].to_numpy(dtype=object).ravel()
+    codes, diags = pd.factorize(dx_values, sort=True)
+    codes = codes.reshape(len(data_up_to_dropped), len(og_diag_cols))
+    
+    # Get list of new column names (diagnoses with names that differ only in forbidden chars go to the same column)
+    diag_col_names = ["Diag." + util.remove_chars_forbidden_in_file_names(diag) for diag in diags]
+    new_diag_col_positions = {}
+    for name, diag in zip(diag_col_names, diags):
+        if diag != ' ':
+            new_diag_col_positions.setdefault(name, len(new_diag_col_positions))
+    new_diag_cols = list(new_diag_col_positions.keys())
+    col_positions = np.array([new_diag_col_positions[name] if diag != ' ' else -1 for name, diag in zip(diag_col_names, diags)], dtype=int)
+
+    # Make new columns: True if diagnosis is in any of the DX columns
+    rows, dx_cols = np.nonzero(codes >= 0)
+    new_col_positions = col_positions[codes[rows, dx_cols]]
+    is_diag = np.zeros((len(data_up_to_dropped), len(new_diag_cols)), dtype=bool)
+    is_diag[rows[new_col_positions >= 0], new_col_positions[new_col_positions >= 0]] = True
+
     # Drop original diag columns
     data_up_to_dropped = data_up_to_dropped.drop(og_diag_cols, axis=1)
 
+    # Add all new columns at once
+    data_up_to_dropped = pd.concat([data_up_to_dropped, pd.DataFrame(is_diag, columns=new_diag_cols, index=data_up_to_dropped.index)], axis=1)
+
     return data_up_to_dropped
 
 def transform_devhx_eduhx_cols(data_up_to_dropped):
@@ -209,7 +275,8 @@ def transform_devhx_eduhx_cols(data_up_to_dropped):
     list_of_preg_symp_cols = [x for x in data_up_to_dropped.columns if "preg_symp" in x]
     
     # If any of the preg_symp columns are 1, then the preg_symp column is 1
-    data_up_to_dropped["preg_symp"] = (data_up_to_dropped[list_of_preg_symp_cols] == 1).any(axis=1)
+    #   (compared as numbers: when the release was read as strings, "1" == 1 was never true and preg_symp was always 0)
+    data_up_to_dropped["preg_symp"] = (data_up_to_dropped[list_of_preg_symp_cols].apply(pd.to_numeric, errors="coerce") == 1).any(axis=1)
 
     # Drop original preg_symp columns
     data_up_to_dropped = data_up_to_dropped.drop(list_of_preg_symp_cols, axis=1) 
@@ -218,158 +285,209 @@ def transform_devhx_eduhx_cols(data_up_to_dropped):
 
     return data_up_to_dropped
 
-def separate_item_lvl_from_scale_scores(data_up_to_dropped, columns_until_dropped):
-
-    total_score_cols_w_raw = ["SCQ,SCQ_Total", 
-                        "Barratt,Barratt_Total", 
-                        #"ASSQ,ASSQ_Total", # Need for NVLD prediction, don't forget to exclude from input vars in create_datasets.py
-                        "ARI_P,ARI_P_Total_Score", 
-                        "SWAN,SWAN_Total",
-                        "SRS,SRS_Total", 
-                        "SRS,SRS_Total_T", 
-                        "CBCL,CBCL_Total",
-                        "CBCL,CBCL_Total_T",
-                        "ICU_P,ICU_P_Total",
-                        "ICU_SR,ICU_SR_Total",
-                        "APQ_P,APQ_P_Total",
-                        "PCIAT,PCIAT_Total",
-                        "DTS,DTS_Total",
-                        "MFQ_P,MFQ_P_Total",
-                        "APQ_SR,APQ_SR_Total",
-                        "WHODAS_P,WHODAS_P_Total", 
-                        "CIS_P,CIS_P_Score", 
-                        "PSI,PSI_Total",
-                        "PSI,PSI_Total_T",
-                        "RBS,RBS_Total",
-                        "SCARED_P,SCARED_P_Total",
-                        "SCARED_SR,SCARED_SR_Total",
-                        "WHODAS_SR,WHODAS_SR_Score", 
-                        "CIS_SR,CIS_SR_Total", 
-                        # "C3SR,C3SR_Total", # Doesn't have a total
-                        # "CCSC,CCSC_Total",  # Doesn't have a total
-                        # "CPIC,CPIC_Total", # Doesn't have a total
-                        "YSR,YSR_Total",
-                        "YSR,YSR_Total_T",
-                        "CBCL_Pre,CBCL_Pre_Total",
-                        "CBCL_Pre,CBCL_Pre_Total_T",
-                        "SRS_Pre,SRS_Pre_Total",
-                        "SRS_Pre,SRS_Pre_Total_T",
-                        "ASR,ASR_Total",
-                        "ASR,ASR_Total_T",
-                    ]
-    total_score_raw_cols = [x.strip("_T") for x in total_score_cols_w_raw if x.endswith("_T")]
-    subscale_score_cols_w_raw = ["Barratt,Barratt_Total_Edu", "Barratt,Barratt_Total_Occ",
-                        "SWAN,SWAN_HY", "SWAN,SWAN_IN",
-                        "SRS,SRS_AWR_T", "SRS,SRS_AWR", "SRS,SRS_COG_T", "SRS,SRS_COG", "SRS,SRS_COM_T", "SRS,SRS_COM", "SRS,SRS_DSMRRB_T", "SRS,SRS_DSMRRB", "SRS,SRS_MOT_T", "SRS,SRS_MOT", "SRS,SRS_RRB_T", "SRS,SRS_RRB", "SRS,SRS_SCI_T", "SRS,SRS_SCI",
-                        "CBCL,CBCL_AB_T", "CBCL,CBCL_AB", "CBCL,CBCL_AD_T", "CBCL,CBCL_AD", "CBCL,CBCL_AP_T", "CBCL,CBCL_AP", "CBCL,CBCL_Ext_T", "CBCL,CBCL_Ext", "CBCL,CBCL_Int_T", "CBCL,CBCL_Int", "CBCL,CBCL_RBB_T", "CBCL,CBCL_RBB", "CBCL,CBCL_SC_T", "CBCL,CBCL_SC", 
-                        # "CBCL,CBCL_SP_T",  Need for NVLD prediction, don't forget to exclude from input vars in create_datasets.py
-                        "CBCL,CBCL_SP", "CBCL,CBCL_TP_T", "CBCL,CBCL_TP", "CBCL,CBCL_WD_T", "CBCL,CBCL_WD", "CBCL,CBCL_C", "CBCL,CBCL_OP",
-                        "ICU_P,ICU_P_Callous", "ICU_P,ICU_P_Uncaring", "ICU_P,ICU_P_Unemotional",
-                        "ICU_SR,ICU_SR_Callous", "ICU_SR,ICU_SR_Uncaring", "ICU_SR,ICU_SR_Unemotional",
-                        "PANAS_PositiveAffect", "PANAS_NegativeAffect",
-                        "APQ_P,APQ_P_CP", "APQ_P,APQ_P_ID", "APQ_P,APQ_P_INV", "APQ_P,APQ_P_OPD", "APQ_P,APQ_P_PM", "APQ_P,APQ_P_PP",
-                        "DTS,DTS_absorption", "DTS,DTS_appraisal", "DTS,DTS_regulation", "DTS,DTS_tolerance",
-                        "APQ_SR,APQ_SR_CP", "APQ_SR,APQ_SR_ID", "APQ_SR,APQ_SR_INV_D", "APQ_SR,APQ_SR_INV_M", "APQ_SR,APQ_SR_OPD", "APQ_SR,APQ_SR_PM", "APQ_SR,APQ_SR_PP",
-                        "PSI,PSI_DC_T", "PSI,PSI_DC", "PSI,PSI_PCDI_T", "PSI,PSI_PCDI", "PSI,PSI_PD_T", "PSI,PSI_PD",
-                        "RBS,RBS_Score_01", "RBS,RBS_Score_02", "RBS,RBS_Score_03", "RBS,RBS_Score_04", "RBS,RBS_Score_05",  
-                        "SCARED_P,SCARED_P_GD", "SCARED_P,SCARED_P_PN", "SCARED_P,SCARED_P_SC", "SCARED_P,SCARED_P_SH", "SCARED_P,SCARED_P_SP",
-                        "SCARED_SR,SCARED_SR_GD", "SCARED_SR,SCARED_SR_PN", "SCARED_SR,SCARED_SR_SC", "SCARED_SR,SCARED_SR_SH", "SCARED_SR,SCARED_SR_SP",
-                        "C3SR,C3SR_AG", "C3SR,C3SR_AG_T", "C3SR,C3SR_FR", "C3SR,C3SR_FR_T", "C3SR,C3SR_HY", "C3SR,C3SR_HY_T", "C3SR,C3SR_IN", "C3SR,C3SR_IN_T", "C3SR,C3SR_LP", "C3SR,C3SR_LP_T", "C3SR,C3SR_NI", "C3SR,C3SR_PI",
-                        "CCSC,CCSC_PFC", "CCSC,CCSC_CDM", "CCSC,CCSC_DPS", "CCSC,CCSC_SU", "CCSC,CCSC_AC", "CCSC,CCSC_AA", "CCSC,CCSC_REP", "CCSC,CCSC_WT", "CCSC,CCSC_PCR", "CCSC,CCSC_CON", "CCSC,CCSC_OPT", "CCSC,CCSC_POS", "CCSC,CCSC_REL", "CCSC,CCSC_SS", "CCSC,CCSC_SUPMF", "CCSC,CCSC_SUPOA", "CCSC,CCSC_SUPEER", "CCSC,CCSC_SUPSIB",
-                        "CPIC,CPIC_Frequency_Total", "CPIC,CPIC_Intensity_Total", "CPIC,CPIC_Resolution_Total", "CPIC,CPIC_Content_Total", "CPIC,CPIC_Perceived_Threat_Total", "CPIC,CPIC_Self_Blame_Total", "CPIC,CPIC_Triangulation_Total", "CPIC,CPIC_Stability_Total",
-                        "YSR,YSR_AB", "YSR,YSR_AB_T", "YSR,YSR_AD", "YSR,YSR_AD_T", "YSR,YSR_AP", "YSR,YSR_AP_T", "YSR,YSR_WD", "YSR,YSR_WD_T", "YSR,YSR_RBB", "YSR,YSR_RBB_T", "YSR,YSR_SC", "YSR,YSR_SC_T", "YSR,YSR_SP", "YSR,YSR_SP_T", "YSR,YSR_TP", "YSR,YSR_TP_T", "YSR,YSR_Ext", "YSR,YSR_Ext_T", "YSR,YSR_Int", "YSR,YSR_Int_T", "YSR,YSR_OP", "YSR,YSR_C", "YSR,YSR_Total", "YSR,YSR_Total_T",
-                        "CBCL_Pre,CBCL_Pre_AB", "CBCL_Pre,CBCL_Pre_AB_T", "CBCL_Pre,CBCL_Pre_AD", "CBCL_Pre,CBCL_Pre_AD_T", "CBCL_Pre,CBCL_Pre_AP", "CBCL_Pre,CBCL_Pre_AP_T", "CBCL_Pre,CBCL_Pre_SC", "CBCL_Pre,CBCL_Pre_SC_T", "CBCL_Pre,CBCL_Pre_SP", "CBCL_Pre,CBCL_Pre_SP_T", "CBCL_Pre,CBCL_Pre_WD", "CBCL_Pre,CBCL_Pre_WD_T", "CBCL_Pre,CBCL_Pre_Ext", "CBCL_Pre,CBCL_Pre_Ext_T", "CBCL_Pre,CBCL_Pre_Int", "CBCL_Pre,CBCL_Pre_Int_T", "CBCL_Pre,CBCL_Pre_DSM_ADHP", "CBCL_Pre,CBCL_Pre_DSM_ADHP_T", "CBCL_Pre,CBCL_Pre_DSM_AnxP", "CBCL_Pre,CBCL_Pre_DSM_AnxP_T", "CBCL_Pre,CBCL_Pre_DSM_AP", "CBCL_Pre,CBCL_Pre_DSM_AP_T", "CBCL_Pre,CBCL_Pre_DSM_ODP", "CBCL_Pre,CBCL_Pre_DSM_ODP_T", "CBCL_Pre,CBCL_Pre_DSM_PDP", "CBCL_Pre,CBCL_Pre_DSM_PDP_T", "CBCL_Pre,CBCL_Pre_OP", "CBCL_Pre,CBCL_Pre_Total", "CBCL_Pre,CBCL_Pre_Total_T",
-                        "SRS_Pre,SRS_Pre_AWR_T", "SRS_Pre,SRS_Pre_AWR", "SRS_Pre,SRS_Pre_COG_T", "SRS_Pre,SRS_Pre_COG", "SRS_Pre,SRS_Pre_COM_T", "SRS_Pre,SRS_Pre_COM", "SRS_Pre,SRS_Pre_DSMRRB_T", "SRS_Pre,SRS_Pre_DSMRRB", "SRS_Pre,SRS_Pre_MOT_T", "SRS_Pre,SRS_Pre_MOT", "SRS_Pre,SRS_Pre_RRB_T", "SRS_Pre,SRS_Pre_RRB", "SRS_Pre,SRS_Pre_SCI_T", "SRS,SRS_Pre_SCI",
-                        "ASR,ASR_AD", "ASR,ASR_AD_T", "ASR,ASR_WD", "ASR,ASR_WD_T", "ASR,ASR_SC", "ASR,ASR_SC_T", "ASR,ASR_TP", "ASR,ASR_TP_T", "ASR,ASR_AP", "ASR,ASR_AP_T", "ASR,ASR_RBB", "ASR,ASR_RBB_T", "ASR,ASR_AB", "ASR,ASR_AB_T", "ASR,ASR_OP", "ASR,ASR_Int", "ASR,ASR_Int_T", "ASR,ASR_Ext", "ASR,ASR_Ext_T", "ASR,ASR_Intrusive", "ASR,ASR_Intrusive_T", "ASR,ASR_C", 
-                        ]
-    subscale_score_raw_cols = [x.strip("_T") for x in subscale_score_cols_w_raw if x.endswith("_T")]
+def get_columns_added_after_dropped(catalog, assessments_until_dropped):
+    # Columns not of the assessments until dropped: missingness markers, diagnosis columns, aggregated columns (preg_symp)
+    assessments_until_dropped = set(assessments_until_dropped)
+    added_cols = list(catalog["missing_marker"].values())
+    for assessment, cols in catalog["columns_by_assessment"].items():
+        if assessment not in assessments_until_dropped:
+            added_cols.extend(cols)
+    return added_cols
+
+def get_columns_in_frame_order(catalog, cols):
+    # Unique columns in the order of the frame the catalog was built from
+    return sorted(set(cols), key=catalog["position"].__getitem__)
+
+def separate_item_lvl_from_scale_scores(data_up_to_dropped, catalog, assessments_until_dropped):
+    # Total and subscale score columns come from the column catalog (kinds), raw scores are looked up as sets
+    total_score_cols_w_raw = column_catalog.TOTAL_SCORE_COLS_W_RAW_SET
+    subscale_score_cols_w_raw = column_catalog.SUBSCALE_SCORE_COLS_W_RAW_SET
+    total_score_raw_cols = set(column_catalog.TOTAL_SCORE_RAW_COLS)
+    subscale_score_raw_cols = set(column_catalog.SUBSCALE_SCORE_RAW_COLS)
+    total_cols = catalog["columns_by_kind"].get("total", ())
+    subscale_cols = catalog["columns_by_kind"].get("subscale", ())
+    added_cols = get_columns_added_after_dropped(catalog, assessments_until_dropped)
 
     # Item level columns = all columns except those of total and subscale scores (includes diag cols)
-    item_level_cols = [x for x in columns_until_dropped if (x not in total_score_cols_w_raw) and (x not in subscale_score_cols_w_raw)]
-    item_level_col_subset = [x for x in data_up_to_dropped.columns if (x not in total_score_cols_w_raw) and (x not in subscale_score_cols_w_raw)]
-    data_up_to_dropped_item_lvl = data_up_to_dropped[item_level_col_subset]
+    data_up_to_dropped_item_lvl = data_up_to_dropped.drop(list(total_cols) + list(subscale_cols), axis=1)
 
-    # Total columns = all columns except those for item_level (calculated above), all subscale scores, and raw total scores (only keep t-scores)
-    total_score_col_subset = [x for x in data_up_to_dropped.columns if (x not in item_level_cols) and (x not in subscale_score_cols_w_raw) and (x not in total_score_raw_cols)]
-    data_up_to_dropped_total_scores = data_up_to_dropped[total_score_col_subset]
+    # Total columns = total scores and columns added after the dropped assessment, except subscale scores and raw total scores (only keep t-scores)
+    total_score_col_subset = [x for x in list(total_cols) + added_cols if (x not in subscale_score_cols_w_raw) and (x not in total_score_raw_cols)]
+    data_up_to_dropped_total_scores = data_up_to_dropped[get_columns_in_frame_order(catalog, total_score_col_subset)]
 
-    # Subscale columns = all columns except those for item_level (calculated above), all total scores, and raw subscale scores (only keep t-scores)
-    subscale_score_col_subset = [x for x in data_up_to_dropped.columns if (x not in item_level_cols) and (x not in total_score_cols_w_raw) and (x not in subscale_score_raw_cols)]
-    data_up_to_dropped_subscale_scores = data_up_to_dropped[subscale_score_col_subset]
+    # Subscale columns = subscale scores and columns added after the dropped assessment, except total scores and raw subscale scores (only keep t-scores)
+    subscale_score_col_subset = [x for x in list(subscale_cols) + added_cols if (x not in total_score_cols_w_raw) and (x not in subscale_score_raw_cols)]
+    data_up_to_dropped_subscale_scores = data_up_to_dropped[get_columns_in_frame_order(catalog, subscale_score_col_subset)]
 
     return data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores
 
-def remove_irrelavent_missing_markers(data_up_to_dropped, data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores):
-    was_missing_cols = [x for x in data_up_to_dropped.columns if "_WAS_MISSING" in x]
-    was_missing_col_originals = [x.split("_WAS_MISSING")[0] for x in was_missing_cols]
-
-    for col in was_missing_col_originals:
-        if col not in data_up_to_dropped_item_lvl.columns and col +"_WAS_MISSING" in data_up_to_dropped_item_lvl.columns:
-            data_up_to_dropped_item_lvl = data_up_to_dropped_item_lvl.drop(col+"_WAS_MISSING", axis=1)
-        
-    for col in was_missing_col_originals:
-        if col not in data_up_to_dropped_total_scores.columns and col +"_WAS_MISSING" in data_up_to_dropped_total_scores.columns:
-            data_up_to_dropped_total_scores = data_up_to_dropped_total_scores.drop(col+"_WAS_MISSING", axis=1)
-        
-    for col in was_missing_col_originals:
-        if col not in data_up_to_dropped_subscale_scores.columns and col +"_WAS_MISSING" in data_up_to_dropped_subscale_scores.columns:
-            data_up_to_dropped_subscale_scores = data_up_to_dropped_subscale_scores.drop(col+"_WAS_MISSING", axis=1)
+def remove_irrelavent_missing_markers(catalog, data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores):
+    # Drop markers whose original column is not in the dataset (looked up through the catalog's marker links)
+    def get_irrelevant_markers(dataset):
+        return [marker for col, marker in catalog["missing_marker"].items() if (col not in dataset.columns) and (marker in dataset.columns)]
+
+    data_up_to_dropped_item_lvl = data_up_to_dropped_item_lvl.drop(get_irrelevant_markers(data_up_to_dropped_item_lvl), axis=1)
+    data_up_to_dropped_total_scores = data_up_to_dropped_total_scores.drop(get_irrelevant_markers(data_up_to_dropped_total_scores), axis=1)
+    data_up_to_dropped_subscale_scores = data_up_to_dropped_subscale_scores.drop(get_irrelevant_markers(data_up_to_dropped_subscale_scores), axis=1)
 
     return data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores
 
-def export_datasets(data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores, data_output_dir):
-    data_up_to_dropped_item_lvl.to_csv(data_output_dir + "item_lvl.csv", index=False)
-    data_up_to_dropped_subscale_scores.to_csv(data_output_dir + "subscale_scores.csv", index=False)
-    data_up_to_dropped_total_scores.to_csv(data_output_dir + "total_scores.csv", index=False)
+def narrow_float_dtypes(chunk):
+    # Numeric columns (int64 in chunks without missing values, float64 otherwise) exact in float32 as float32. 
+    #   A column that is float32 in some chunks and float64 in others is float64 after concatenation (still exact). 
+    #   Narrowed columns are moved to the end of the chunk (one astype for all of them)
+    cols_to_narrow = [col for col, dtype in chunk.dtypes.items() if dtype in (np.int64, np.float64) and is_float32_exact(chunk[col].to_numpy(dtype=np.float64))]
+    if not cols_to_narrow:
+        return chunk
+    return pd.concat([chunk.drop(cols_to_narrow, axis=1), chunk[cols_to_narrow].astype(np.float32)], axis=1)
+
+def clean_loris_release_chunk(chunk):
+    # Steps that only need the rows of the chunk. Returns the reduced chunk, and the columns with values in the chunk and the 
+    #   questionnaires with values in rows with underscores in ID, which are dropped once all chunks are read
+    non_empty_columns = chunk.columns[chunk.notna().any()]
+
+    # Remove irrelevant NIH toolbox columns
+    chunk = remove_irrelevant_nih_cols(chunk)
+
+    # Catalog of columns (assessment and kind of each column), built once: same columns in all chunks (memoised), 
+    #   the columns of the steps below are a subset of these
+    catalog = column_catalog.build_column_catalog(chunk.columns)
+    chunk = remove_admin_cols(chunk, catalog)
+
+    # Get ID columns (contain quetsionnaire names, e.g. 'ACE,EID', will be used to check if an assessment is filled)
+    EID_cols = [x for x in chunk.columns if ",EID" in x]
+
+    # Get ID col from EID cols
+    chunk = get_ID_from_EID(chunk, EID_cols)
+
+    non_empty_questionnaires_in_underscore = get_questionnaires_in_rows_w_underscore_in_id(chunk)
+    chunk = drop_rows_w_underscore_in_id(chunk)
+
+    # Remove incomplete DX and missing DX
+    chunk = remove_incomplete_and_missing_diag(chunk)    
+    ### => The first drop-off in number of respondents is at ICU_P, 
+    # then SCARED_SR (the biggest drop off, and it's the first assessment with an age restriction). Last drop off is at CPIC.
+
+    return narrow_float_dtypes(chunk), chunk.columns, non_empty_columns, non_empty_questionnaires_in_underscore
+
+def clean_loris_release(chunks):
+    # Chunks are reduced (rows and columns dropped, dtypes narrowed) one at a time, only reduced chunks are kept in memory
+    #   (map: a raw chunk is released once it is cleaned, before the next one is read)
+    cleaned_chunks = []
+    non_empty_columns = set()
+    non_empty_questionnaires_in_underscore = set()
+    for cleaned_chunk, cleaned_columns, chunk_non_empty_columns, chunk_questionnaires_in_underscore in map(clean_loris_release_chunk, chunks):
+        cleaned_chunks.append(cleaned_chunk)
+        non_empty_columns.update(chunk_non_empty_columns)
+        non_empty_questionnaires_in_underscore |= chunk_questionnaires_in_underscore
+    full_wo_underscore = pd.concat(cleaned_chunks)
+
+    # Drop empty columns (empty in all rows read, before rows were dropped), columns back in the order of the file
+    full_wo_underscore = full_wo_underscore[[x for x in cleaned_columns if x in non_empty_columns or x == "ID"]]
+
+    catalog = column_catalog.build_column_catalog(full_wo_underscore.columns)
+    full_wo_underscore = drop_questionnaires_in_rows_w_underscore_in_id(full_wo_underscore, catalog, non_empty_questionnaires_in_underscore)
+
+    return full_wo_underscore
+
+def get_cleaned_data_cache_path(path, relevent_assessments_list):
+    # Cached cleaned data is only valid for the same raw file, cleaning code, and assessments read
+    cache_key = hashlib.sha256()
+    cache_key.update(util.get_file_hash(path).encode())
+    cache_key.update(str(CLEANING_CODE_VERSION).encode())
+    cache_key.update(",".join(relevent_assessments_list).encode())
+    
+    raw_file_name = os.path.splitext(os.path.basename(path))[0]
+    return CLEANED_DATA_CACHE_DIR + raw_file_name + "___cleaned___" + cache_key.hexdigest()[:16] + ".parquet"
+
+def get_cleaned_loris_release(path, relevent_assessments_list):
+    cache_path = get_cleaned_data_cache_path(path, relevent_assessments_list)
+
+    # The cache only saves time: if it can't be read or written, clean the raw file / keep the data in memory
+    if os.path.exists(cache_path):
+        try:
+            cached = pd.read_parquet(cache_path)
+            print("Reading cleaned data from cache: ", cache_path)
+            return cached
+        except (ImportError, ValueError, TypeError, NotImplementedError, OSError) as e:
+            warnings.warn(f"Can't read cleaned data cache {cache_path}, cleaning raw data again: {e}")
+
+    full_wo_underscore = clean_loris_release(read_loris_release(path, relevent_assessments_list, chunksize=LORIS_RELEASE_CHUNKSIZE))
+
+    try:
+        util.create_dir_if_not_exists(CLEANED_DATA_CACHE_DIR)
+        full_wo_underscore.to_parquet(cache_path)
+        print("Saved cleaned data to cache: ", cache_path)
+    except ImportError:
+        # Parquet needs pyarrow or fastparquet
+        warnings.warn("Can't cache cleaned data: install pyarrow to save parquet files")
+    except (ValueError, TypeError, NotImplementedError, OSError) as e:
+        # pyarrow conversion errors (ArrowInvalid, ArrowTypeError, ArrowNotImplementedError subclass these) or disk errors
+        warnings.warn(f"Can't cache cleaned data, continuing without cache: {e}")
+        if os.path.exists(cache_path):
+            os.remove(cache_path) # Don't leave a partly written file that would be read next time
+
+    return full_wo_underscore
+
+def get_dtypes_path(csv_path):
+    return csv_path[:-len(".csv")] + "_dtypes.json"
+
+def export_dataset(dataset, csv_path):
+    # Save dtypes next to the csv so compact dtypes are restored when reading it
+    dataset.to_csv(csv_path, index=False)
+    with open(get_dtypes_path(csv_path), "w") as f:
+        json.dump({col: str(dtype) for col, dtype in dataset.dtypes.items()}, f, indent=1)
+
+def read_dataset_csv(csv_path):
+    dtypes_path = get_dtypes_path(csv_path)
+    if os.path.exists(dtypes_path):
+        with open(dtypes_path) as f:
+            dtypes = json.load(f)
+        return pd.read_csv(csv_path, dtype=dtypes, float_precision="round_trip") # Default float parser can be off by one bit
+    return pd.read_csv(csv_path)
 
-def make_full_dataset(only_assessment_distribution, first_assessment_to_drop, only_free_assessments, dirs):
+def export_datasets(data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores, data_output_dir):
+    export_dataset(data_up_to_dropped_item_lvl, data_output_dir + "item_lvl.csv")
+    export_dataset(data_up_to_dropped_subscale_scores, data_output_dir + "subscale_scores.csv")
+    export_dataset(data_up_to_dropped_total_scores, data_output_dir + "total_scores.csv")
 
-    cog_task_cols = {"WISC": ["WISC,WISC_FSIQ", "WISC,WISC_PSI", "WISC,WISC_VCI", "WISC,WISC_VSI"], 
-                     "WIAT": ["WIAT,WIAT_Num_Stnd", "WIAT,WIAT_Word_Stnd", "WIAT,WIAT_Spell_Stnd", "WIAT,WIAT_Num_P", "WIAT,WIAT_Word_P"]}
+def get_cog_task_cols():
+    return {"WISC": ["WISC,WISC_FSIQ", "WISC,WISC_PSI", "WISC,WISC_VCI", "WISC,WISC_VSI"], 
+            "WIAT": ["WIAT,WIAT_Num_Stnd", "WIAT,WIAT_Word_Stnd", "WIAT,WIAT_Spell_Stnd", "WIAT,WIAT_Num_P", "WIAT,WIAT_Word_P"]}
 
+def get_relevant_assessments_list(cog_task_cols):
     # Get relevant assessments: 
     #   relevant cognitive tests, Questionnaire Measures of Emotional and Cognitive Status, and 
     #   Questionnaire Measures of Family Structure, Stress, and Trauma (from Assessment_List_Jan2019.xlsx)
-    relevent_assessments_list = ["Basic_Demos", "PreInt_EduHx", "PreInt_DevHx", "NIH_Scores", "SympChck", "SCQ", "Barratt", 
+    return ["Basic_Demos", "PreInt_EduHx", "PreInt_DevHx", "NIH_Scores", "SympChck", "SCQ", "Barratt", 
         "ASSQ", "ARI_P", "SDQ", "SWAN", "SRS", "CBCL", "ICU_P", "ICU_SR", "PANAS", "APQ_P", "PCIAT", "DTS", "ESWAN", "MFQ_P", "APQ_SR", 
         "WHODAS_P", "CIS_P", "SAS", "PSI", "RBS", "PhenX_Neighborhood", "WHODAS_SR", "CIS_SR", "SCARED_P", "SCARED_SR", 
         "C3SR", "CCSC", "CPIC", "YSR", "PhenX_SchoolRisk", "CBCL_Pre", "SRS_Pre", "ASR"] + list(cog_task_cols.keys())
-    
-    if only_free_assessments == 1:
-        relevent_assessments_list = remove_proprietary_assessments(relevent_assessments_list)
 
-    # LORIS saved query (all data)
-    full = pd.read_csv("data/raw/LORIS-release-10.csv", dtype=object)
-    
-    # Replace NaN (currently ".") values with np.nan
-    full = full.replace(".", np.nan)
-
-    # Drop first row (doesn't have ID)
-    full = full.iloc[1: , :]
+def get_cleaned_data():
+    # Read and clean data (or read cleaned data from cache), proprietary assessments are removed after, 
+    #   to use the same cache with and without only_free_assessments
+    return get_cleaned_loris_release(LORIS_RELEASE_PATH, get_relevant_assessments_list(get_cog_task_cols()))
 
-    # Drop empty columns
-    full = full.dropna(how='all', axis=1)
+def make_full_dataset(only_assessment_distribution, first_assessment_to_drop, only_free_assessments, dirs, full_wo_underscore=None):
 
-    # Remove irrelevant NIH toolbox columns
-    full = remove_irrelevant_nih_cols(full)
+    cog_task_cols = get_cog_task_cols()
+    relevent_assessments_list = get_relevant_assessments_list(cog_task_cols)
+    
+    # Cleaned data can be passed when making datasets for several cutoffs from the same data (create_datasets_for_cutoffs.py)
+    if full_wo_underscore is None:
+        full_wo_underscore = get_cleaned_data()
 
-    full = remove_admin_cols(full)
+    if only_free_assessments == 1:
+        relevent_assessments_list = remove_proprietary_assessments(relevent_assessments_list)
 
     # Get ID columns (contain quetsionnaire names, e.g. 'ACE,EID', will be used to check if an assessment is filled)
-    EID_cols = [x for x in full.columns if ",EID" in x]
-
-    # Get ID col from EID cols
-    full = get_ID_from_EID(full, EID_cols)
-
-    full_wo_underscore = drop_rows_w_underscore_in_id(full)
+    EID_cols = [x for x in full_wo_underscore.columns if ",EID" in x]
 
     # Drop questionnaires present in rows with underscores from data from list of ID columns
     EID_cols = [x for x in EID_cols if 'TRF' not in x]
     EID_cols = [x for x in EID_cols if 'DailyMeds' not in x]
 
-    # Remove incomplete DX and missing DX
-    full_wo_underscore = remove_incomplete_and_missing_diag(full_wo_underscore)    
-
     # Get list of assessments in data
     assessment_list = set([x.split(",")[0] for x in EID_cols])
 
@@ -397,7 +515,8 @@ def make_full_dataset(only_assessment_distribution, first_assessment_to_drop, on
 
         # Get data up to the dropped assessment
         # Get only people who took the most popular assessments until the first one from the drop list 
-        columns_until_dropped = get_columns_until_dropped(full_wo_underscore, EID_columns_until_dropped)
+        assessments_until_dropped = get_assessments_until_dropped(EID_columns_until_dropped)
+        columns_until_dropped = column_catalog.get_columns_of_assessments(column_catalog.build_column_catalog(full_wo_underscore.columns), assessments_until_dropped)
         data_up_to_dropped = get_data_up_to_dropped(full_wo_underscore, EID_columns_until_dropped, columns_until_dropped)
 
         # Remove EID columns: not needed anymore
@@ -437,14 +556,15 @@ def make_full_dataset(only_assessment_distribution, first_assessment_to_drop, on
         # Remove ID column - not needed anymore
         data_up_to_dropped = data_up_to_dropped.drop("ID", axis=1)
 
-        # Convert new boolean columns to numeric
-        data_up_to_dropped = data_up_to_dropped.replace({True: 1, False: 0})
+        # Convert to compact dtypes (new boolean columns to numeric)
+        data_up_to_dropped = data_up_to_dropped.astype(get_compact_dtypes(data_up_to_dropped))
 
         # Separate subscale and total scores
-        data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores = separate_item_lvl_from_scale_scores(data_up_to_dropped, columns_until_dropped)
+        catalog = column_catalog.build_column_catalog(data_up_to_dropped.columns)
+        data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores = separate_item_lvl_from_scale_scores(data_up_to_dropped, catalog, assessments_until_dropped)
 
         # Remove _WAS_MISSING columns that are not linked to any columns from each dataset
-        data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores = remove_irrelavent_missing_markers(data_up_to_dropped, 
+        data_up_to_dropped_item_lvl, data_up_to_dropped_total_scores, data_up_to_dropped_subscale_scores = remove_irrelavent_missing_markers(catalog, 
             data_up_to_dropped_item_lvl, 
             data_up_to_dropped_total_scores, 
             data_up_to_dropped_subscale_scores)
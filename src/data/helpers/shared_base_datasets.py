@@ -0,0 +1,52 @@
+from collections.abc import Mapping
+
+SPLITS = ["train", "test", "train_train", "val", "test_only_healthy_controls", "val_only_healthy_controls"]
+
+# Same key order as the per-diagnosis dicts we used to save
+DATASET_KEYS = ["X_train", "X_test", "y_train", "y_test", 
+                "X_train_train", "X_val", "y_train_train", "y_val", 
+                "X_test_only_healthy_controls", "y_test_only_healthy_controls", 
+                "X_val_only_healthy_controls", "y_val_only_healthy_controls"]
+
+class DiagDataset(Mapping):
+    # Datasets of one diagnosis: only row positions of each split and positions of input columns are stored, 
+    #   X and y DataFrames are built from the shared full dataset on access
+    def __init__(self, full_dataset, diag, rows_per_split, input_col_positions):
+        self.full_dataset = full_dataset
+        self.diag = diag
+        self.rows_per_split = rows_per_split
+        self.input_col_positions = input_col_positions
+
+    def __getitem__(self, key):
+        if key not in DATASET_KEYS:
+            raise KeyError(key)
+        X_or_y, split = key.split("_", 1)
+        rows = self.rows_per_split[split]
+        if X_or_y == "X":
+            return self.full_dataset.iloc[rows, self.input_col_positions]
+        else:
+            return self.full_dataset[self.diag].iloc[rows]
+
+    def __iter__(self):
+        return iter(DATASET_KEYS)
+
+    def __len__(self):
+        return len(DATASET_KEYS)
+
+class SharedBaseDatasets(Mapping):
+    # Datasets for all diagnoses, holding the full dataset once (datasets[diag]["X_val"])
+    def __init__(self, full_dataset):
+        self.full_dataset = full_dataset
+        self.diag_datasets = {}
+
+    def add_diag(self, diag, rows_per_split, input_col_positions):
+        self.diag_datasets[diag] = DiagDataset(self.full_dataset, diag, rows_per_split, input_col_positions)
+
+    def __getitem__(self, diag):
+        return self.diag_datasets[diag]
+
+    def __iter__(self):
+        return iter(self.diag_datasets)
+
+    def __len__(self):
+        return len(self.diag_datasets)
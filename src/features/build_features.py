@@ -1,4 +1,30 @@
-def build_nvld(data):
+import pandas as pd
+import numpy as np
+import operator
+
+# Diagnosis rules are nested dicts built with the functions below: conditions on one column (threshold),
+#   on the difference of two columns (difference), and combinations of conditions (all_of, any_of, at_least).
+#   All rules are evaluated together in one pass over the needed columns (evaluate_rules).
+
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq}
+
+def threshold(col, op, value):
+    return {"type": "threshold", "cols": (col,), "op": op, "value": value}
+
+def difference(col_a, col_b, op, value):
+    # Condition on col_a - col_b
+    return {"type": "difference", "cols": (col_a, col_b), "op": op, "value": value}
+
+def all_of(*conditions):
+    return {"type": "at_least", "k": len(conditions), "conditions": conditions}
+
+def any_of(*conditions):
+    return {"type": "at_least", "k": 1, "conditions": conditions}
+
+def at_least(k, *conditions):
+    return {"type": "at_least", "k": k, "conditions": conditions}
+
+def build_nvld_rule():
 
     vci = "WISC,WISC_VCI"
     vsi = "WISC,WISC_VSI"
@@ -8,53 +34,101 @@ def build_nvld(data):
     num = "WIAT,WIAT_Num_P"
     flanker = "NIH_Scores,NIH7_Flanker_P"
     card = "NIH_Scores,NIH7_Card_P"
-        
+
     # Step 1
-    spacial_condition = (data[vci] - data[vsi]) > 15 
-    reading_condition = data[word] >= 16
-    step_1_condition = spacial_condition & reading_condition
-    
+    spacial_condition = difference(vci, vsi, ">", 15)
+    reading_condition = threshold(word, ">=", 16)
+    step_1_condition = all_of(spacial_condition, reading_condition)
+
     # Step 2
-    EF_condition = (data[flanker] < 16) | (data[card] < 16)
-    social_condition = (data[cbcl] >= 70)
-    math_condition = (data[num] <= 16)
-    step2_condition = (social_condition.astype(int) + math_condition.astype(int) + EF_condition.astype(int)) >= 2
+    EF_condition = any_of(threshold(flanker, "<", 16), threshold(card, "<", 16))
+    social_condition = threshold(cbcl, ">=", 70)
+    math_condition = threshold(num, "<=", 16)
+    step2_condition = at_least(2, social_condition, math_condition, EF_condition)
 
     # Step 3
-    asd_condition = data[assq] < 19
+    asd_condition = threshold(assq, "<", 19)
     step_3_condition = asd_condition
-    
-    return step_1_condition & step2_condition & step_3_condition
 
-def make_new_diag_cols(data):
+    return all_of(step_1_condition, step2_condition, step_3_condition)
 
+def get_new_diag_rules():
     # Create new diganosis columns: positive if consensus diagnosis is positive OR if WIAT or WISC score is within range
-    data["New Diag.Specific Learning Disorder with Impairment in Reading"] = (data["WIAT,WIAT_Word_Stnd"] < 85) & (data["WISC,WISC_FSIQ"] > 70)
-    data["New Diag.Specific Learning Disorder with Impairment in Mathematics"] = (data["WIAT,WIAT_Num_Stnd"] < 85) & (data["WISC,WISC_FSIQ"] > 70)
-    data["New Diag.Specific Learning Disorder with Impairment in Written Expression"] = (data["WIAT,WIAT_Spell_Stnd"] < 85)  & (data["WISC,WISC_FSIQ"] > 70)
-    data["New Diag.Intellectual Disability-Mild"] = (data["WISC,WISC_FSIQ"] < 70) 
-    data["New Diag.Borderline Intellectual Functioning"] = ((data["WISC,WISC_FSIQ"] < 85) & (data["WISC,WISC_FSIQ"] > 70))
-    data["New Diag.Processing Speed Deficit"] = (data["WISC,WISC_PSI"] < 85) 
-    data["New Diag.NVLD"] = build_nvld(data)
-    
-    data["New Diag.Specific Learning Disorder with Impairment in Reading - Consensus"] = (data["Diag.Specific Learning Disorder with Impairment in Reading"] == 1)
-    data["New Diag.Specific Learning Disorder with Impairment in Mathematics - Consensus"] = (data["Diag.Specific Learning Disorder with Impairment in Mathematics"] == 1)
-    data["New Diag.Intellectual Disability-Mild - Consensus"] = (data["Diag.Borderline Intellectual Functioning"] == 1)
-    data["New Diag.Borderline Intellectual Functioning - Consensus"] = (data["Diag.Intellectual Disability-Mild"] == 1)
-    data["New Diag.Specific Learning Disorder with Impairment in Written Expression - Consensus"] = (data["Diag.Specific Learning Disorder with Impairment in Written Expression"] == 1) # No task for written expression
+    iq_over_70 = threshold("WISC,WISC_FSIQ", ">", 70)
+    return {
+        "New Diag.Specific Learning Disorder with Impairment in Reading": all_of(threshold("WIAT,WIAT_Word_Stnd", "<", 85), iq_over_70),
+        "New Diag.Specific Learning Disorder with Impairment in Mathematics": all_of(threshold("WIAT,WIAT_Num_Stnd", "<", 85), iq_over_70),
+        "New Diag.Specific Learning Disorder with Impairment in Written Expression": all_of(threshold("WIAT,WIAT_Spell_Stnd", "<", 85), iq_over_70),
+        "New Diag.Intellectual Disability-Mild": threshold("WISC,WISC_FSIQ", "<", 70),
+        "New Diag.Borderline Intellectual Functioning": all_of(threshold("WISC,WISC_FSIQ", "<", 85), iq_over_70),
+        "New Diag.Processing Speed Deficit": threshold("WISC,WISC_PSI", "<", 85),
+        "New Diag.NVLD": build_nvld_rule(),
+        "New Diag.Specific Learning Disorder with Impairment in Reading - Consensus": threshold("Diag.Specific Learning Disorder with Impairment in Reading", "==", 1),
+        "New Diag.Specific Learning Disorder with Impairment in Mathematics - Consensus": threshold("Diag.Specific Learning Disorder with Impairment in Mathematics", "==", 1),
+        "New Diag.Intellectual Disability-Mild - Consensus": threshold("Diag.Borderline Intellectual Functioning", "==", 1),
+        "New Diag.Borderline Intellectual Functioning - Consensus": threshold("Diag.Intellectual Disability-Mild", "==", 1),
+        "New Diag.Specific Learning Disorder with Impairment in Written Expression - Consensus": threshold("Diag.Specific Learning Disorder with Impairment in Written Expression", "==", 1), # No task for written expression
+    }
+
+def collect_atoms(rule, atoms):
+    # Collect distinct threshold and difference conditions (atoms), shared conditions are evaluated once
+    if rule["type"] == "at_least":
+        for condition in rule["conditions"]:
+            collect_atoms(condition, atoms)
+    else:
+        key = (rule["type"], rule["cols"], rule["op"], rule["value"])
+        atoms.setdefault(key, len(atoms))
+
+def evaluate_atoms(data, atoms):
+    # Read all needed columns at once, missing values compare as False (as in pandas)
+    cols = list(dict.fromkeys(col for (_, atom_cols, _, _) in atoms for col in atom_cols))
+    col_positions = {col: i for i, col in enumerate(cols)}
+    values = data[cols].to_numpy(dtype=float, na_value=np.nan) # Nullable integer columns have pd.NA
+
+    # Operand of each atom: a column, or the difference of two columns
+    operands = np.empty((values.shape[0], len(atoms)))
+    thresholds = np.empty(len(atoms))
+    ops = np.empty(len(atoms), dtype=object)
+    for (atom_type, atom_cols, op, value), i in atoms.items():
+        if atom_type == "difference":
+            operands[:, i] = values[:, col_positions[atom_cols[0]]] - values[:, col_positions[atom_cols[1]]]
+        else:
+            operands[:, i] = values[:, col_positions[atom_cols[0]]]
+        thresholds[i] = value
+        ops[i] = op
+
+    # Compare all atoms with the same operator at once
+    atom_values = np.zeros(operands.shape, dtype=bool)
+    for op in set(ops):
+        positions = np.flatnonzero(ops == op)
+        atom_values[:, positions] = OPERATORS[op](operands[:, positions], thresholds[positions])
+    return atom_values
+
+def evaluate_rule(rule, atoms, atom_values):
+    if rule["type"] == "at_least":
+        condition_values = [evaluate_rule(condition, atoms, atom_values) for condition in rule["conditions"]]
+        return np.sum(condition_values, axis=0) >= rule["k"]
+    return atom_values[:, atoms[(rule["type"], rule["cols"], rule["op"], rule["value"])]]
+
+def evaluate_rules(data, rules):
+    atoms = {}
+    for rule in rules.values():
+        collect_atoms(rule, atoms)
+    atom_values = evaluate_atoms(data, atoms)
+
+    results = np.column_stack([evaluate_rule(rule, atoms, atom_values) for rule in rules.values()])
+    return pd.DataFrame(results, columns=list(rules.keys()), index=data.index)
+
+def get_rule_summary(new_diag_cols):
+    positives = new_diag_cols.sum()
+    return pd.DataFrame({"Positive": positives, "Negative": len(new_diag_cols) - positives})
+
+def make_new_diag_cols(data):
+
+    new_diag_cols = evaluate_rules(data, get_new_diag_rules())
+    data[list(new_diag_cols.columns)] = new_diag_cols
 
     print("New diagnosis columns positive value counts:")
-    print(data["New Diag.Specific Learning Disorder with Impairment in Reading"].value_counts())
-    print(data["New Diag.Specific Learning Disorder with Impairment in Mathematics"].value_counts())
-    print(data["New Diag.Specific Learning Disorder with Impairment in Written Expression"].value_counts())
-    print(data["New Diag.Intellectual Disability-Mild"].value_counts())
-    print(data["New Diag.Borderline Intellectual Functioning"].value_counts())
-    print(data["New Diag.Processing Speed Deficit"].value_counts())
-    print(data["New Diag.NVLD"].value_counts())
-    print(data["New Diag.Specific Learning Disorder with Impairment in Reading - Consensus"].value_counts())
-    print(data["New Diag.Specific Learning Disorder with Impairment in Mathematics - Consensus"].value_counts())
-    print(data["New Diag.Intellectual Disability-Mild - Consensus"].value_counts())
-    print(data["New Diag.Borderline Intellectual Functioning - Consensus"].value_counts())
-    print(data["New Diag.Specific Learning Disorder with Impairment in Written Expression - Consensus"].value_counts())
-
-    return data
\ No newline at end of file
+    print(get_rule_summary(new_diag_cols).to_string())
+
+    return data
@@ -2,9 +2,17 @@ from models.train_models import find_best_estimators_and_scores, get_base_models
 from models.evaluate_original_models import get_roc_auc
 from models.helpers.get_feature_subsets_from_rfe_then_sfs import get_feature_subsets_from_rfe_then_sfs
 from models.helpers.get_feature_subsets_from_sfs import get_feature_subsets_from_sfs
+from models.helpers.fold_transform_cache import FoldTransformCache, make_preprocessing
+from models.helpers.lr_forward_selector import LRForwardSelector
 from models.helpers.get_performance_on_feature_subsets import get_performances_on_feature_subsets
 from models.helpers.re_train_models_on_subsets import re_train_models_on_feature_subsets, get_top_n_features
 from models.helpers.idenitfy_thresholds import calculate_thresholds
+from models.helpers.lr_path_search import get_best_lr_on_c_paths
+from models.helpers.rf_oob_search import get_best_rf_by_oob
+from models.helpers.trial_store import TrialStore, get_dataset_fingerprint, get_params_key, get_mean_and_sd_scores
+from models.helpers.batched_random_search import BATCH_SIZE, cant_beat_score, run_batched_random_search
+from models.helpers.svc_precomputed_search import PlattCalibratedSVC, get_best_svc_on_precomputed_kernels
+from models.helpers.matrix_metrics import METRIC_NAMES, get_confusion_matrices_at_thresholds, get_matrix_metrics_from_counts, get_matrix_metrics_at_thresholds
 from models.helpers.write_feature_subsets_to_file import write_feature_subsets_to_file
 from models.helpers.file_helpers import *
 from models.helpers.lr_coefficients_helpers import *
\ No newline at end of file
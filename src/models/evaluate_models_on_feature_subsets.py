@@ -6,6 +6,7 @@ from IPython.core import ultratb
 sys.excepthook = ultratb.FormattedTB(color_scheme='Neutral', call_pdb=False)
 
 import pandas as pd
+import numpy as np
 
 from joblib import dump, load
 
@@ -13,7 +14,7 @@ from joblib import dump, load
 currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
-import models, util
+import models, util, data
 
 DEBUG_MODE = False
 
@@ -54,8 +55,8 @@ def set_up_load_directories():
     return {"load_reports_dir": load_reports_dir, "load_models_dir": load_models_dir}
 
 def make_and_write_cv_auc_table(auc_on_subsets, dir):
-    auc_on_subsets = pd.DataFrame.from_dict(auc_on_subsets)
-    auc_on_subsets.index = range(1, len(auc_on_subsets)+1)
+    # Diagnoses can have different numbers of subsets (feature selection stops early when the CV AUC saturates), missing values are NaN
+    auc_on_subsets = pd.DataFrame({diag: pd.Series(auc_on_subsets[diag], index=range(1, len(auc_on_subsets[diag])+1)) for diag in auc_on_subsets})
     auc_on_subsets = auc_on_subsets.rename(columns={"index": "Diagnosis"})
 
     auc_on_subsets.to_csv(dir+'cv-auc-on-subsets.csv', float_format='%.3f')
@@ -69,13 +70,19 @@ def make_performance_tables_opt_threshold(performances_on_feature_subsets, optim
     sens_table = []
     spec_table = []
 
+    # Diagnoses can have different numbers of subsets (feature selection stops early when the CV AUC saturates), missing values are NaN
+    all_nbs_features = sorted(set(nb_features for diag in performances_on_feature_subsets for nb_features in performances_on_feature_subsets[diag]))
+
     for diag in performances_on_feature_subsets:
         
         diag_row_auc = [diag] # Each row in the table will have the diagnosis and then each columns will be the performance for each number of features
         diag_row_sens = [diag]
         diag_row_spec = [diag]
         
-        for nb_features in performances_on_feature_subsets[diag]:
+        for nb_features in all_nbs_features:
+            if nb_features not in performances_on_feature_subsets[diag]:
+                diag_row_auc, diag_row_sens, diag_row_spec = diag_row_auc + [np.nan], diag_row_sens + [np.nan], diag_row_spec + [np.nan]
+                continue
 
             optimal_threshold = optimal_thresholds[diag][nb_features]
             diag_row_auc = diag_row_auc + [performances_on_feature_subsets[diag][nb_features][optimal_threshold][0]] 
@@ -86,14 +93,14 @@ def make_performance_tables_opt_threshold(performances_on_feature_subsets, optim
         sens_table = sens_table + [diag_row_sens]
         spec_table = spec_table + [diag_row_spec]
 
-    auc_df = pd.DataFrame(auc_table, columns=["Diagnosis"] + list(performances_on_feature_subsets[diag].keys()))
-    sens_df = pd.DataFrame(sens_table, columns=["Diagnosis"] + list(performances_on_feature_subsets[diag].keys()))
-    spec_df = pd.DataFrame(spec_table, columns=["Diagnosis"] + list(performances_on_feature_subsets[diag].keys()))
+    auc_df = pd.DataFrame(auc_table, columns=["Diagnosis"] + all_nbs_features)
+    sens_df = pd.DataFrame(sens_table, columns=["Diagnosis"] + all_nbs_features)
+    spec_df = pd.DataFrame(spec_table, columns=["Diagnosis"] + all_nbs_features)
 
-    # Sort diagnoses by performance on max number of features (sort values by last column)
-    auc_df = auc_df.sort_values(by=auc_df.columns[-1], ascending=False)
-    sens_df = sens_df.sort_values(by=sens_df.columns[-1], ascending=False)
-    spec_df = spec_df.sort_values(by=spec_df.columns[-1], ascending=False)
+    # Sort diagnoses by performance on max number of features checked for each diagnosis (last non-missing value of each row)
+    auc_df = auc_df.loc[auc_df[all_nbs_features].ffill(axis=1).iloc[:, -1].sort_values(ascending=False).index]
+    sens_df = sens_df.loc[sens_df[all_nbs_features].ffill(axis=1).iloc[:, -1].sort_values(ascending=False).index]
+    spec_df = spec_df.loc[spec_df[all_nbs_features].ffill(axis=1).iloc[:, -1].sort_values(ascending=False).index]
 
     # Transpose so that each column is a diagnosis and each row is a number of features
     auc_df = auc_df.transpose()
@@ -225,7 +232,7 @@ def main(models_from_file = 1):
     dirs = set_up_directories()
 
     feature_subsets = load(dirs["input_reports_dir"]+'feature-subsets.joblib')
-    datasets = load(dirs["input_data_dir"]+'datasets.joblib')
+    datasets = data.load_datasets(dirs["input_data_dir"])
     best_estimators = load(dirs["input_models_dir"]+'best-estimators.joblib')
 
     if DEBUG_MODE == True:
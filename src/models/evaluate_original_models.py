@@ -108,7 +108,7 @@ def main(use_test_set=1):
     
     diag_cols = best_estimators.keys()
 
-    datasets = load(dirs["input_data_dir"]+'datasets.joblib')
+    datasets = data.load_datasets(dirs["input_data_dir"])
 
     # Print performances of models on validation set
     roc_aucs = get_roc_aucs(best_estimators, datasets, use_test_set=use_test_set, 
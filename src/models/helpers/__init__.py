@@ -1,6 +1,14 @@
 from helpers.get_feature_subsets_from_rfe_then_sfs import *
 from helpers.get_feature_subsets_from_sfs import *
+from helpers.fold_transform_cache import *
+from helpers.lr_forward_selector import *
 from helpers.idenitfy_thresholds import *
+from helpers.lr_path_search import *
+from helpers.rf_oob_search import *
+from helpers.trial_store import *
+from helpers.batched_random_search import *
+from helpers.svc_precomputed_search import *
+from helpers.matrix_metrics import *
 from helpers.file_helpers import *
 from helpers.lr_coefficients_helpers import *
 from helpers.get_performance_on_feature_subsets import get_performances_on_feature_subsets
@@ -0,0 +1,65 @@
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import GridSearchCV, ParameterSampler
+
+# To import from parent directory
+import os, sys, inspect
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+import models
+
+# Random search that fits candidates in batches. Between batches, scores are written to the trial store (if any, trial_store.py), 
+#   and the search stops early if its best candidate can't beat score_to_beat (if given)
+
+BATCH_SIZE = 10 # Candidates fitted between writes to the trial store and early stopping checks
+
+def cant_beat_score(best_score, sd_of_best_score, score_to_beat):
+    # Best candidate so far doesn't reach the score to beat even one SD above its CV score
+    return score_to_beat is not None and best_score + sd_of_best_score < score_to_beat
+
+def run_batched_random_search(base_model, grid, cv, n_iter, X, y, n_jobs=-1, trial_store=None, random_state=None, score_to_beat=None):
+    # Same candidates on every run with a fixed random_state, only candidates without stored scores on all folds are fitted
+    candidates = list(ParameterSampler(grid, n_iter=n_iter, random_state=random_state))
+    n_folds = cv.get_n_splits()
+
+    fold_scores = trial_store.get_fold_scores() if trial_store is not None else {}
+    if trial_store is not None:
+        n_stored = len([params for params in candidates if all((models.get_params_key(params), fold) in fold_scores for fold in range(n_folds))])
+        print(f"{n_stored} of {len(candidates)} candidates found in trial store")
+
+    for batch_start in range(0, len(candidates), BATCH_SIZE):
+        batch = candidates[batch_start:batch_start + BATCH_SIZE]
+        batch_to_fit = [params for params in batch if any((models.get_params_key(params), fold) not in fold_scores for fold in range(n_folds))]
+
+        if len(batch_to_fit) > 0:
+            gs = GridSearchCV(estimator=base_model, param_grid=[{param: [value] for param, value in params.items()} for params in batch_to_fit],
+                              cv=cv, scoring="roc_auc", refit=False, n_jobs=n_jobs, verbose=1)
+            try:
+                gs.fit(X, y)
+                new_fold_scores = [(params, fold, gs.cv_results_[f"split{fold}_test_score"][i]) for i, params in enumerate(gs.cv_results_["params"]) for fold in range(n_folds)]
+            except ValueError as e:
+                # GridSearchCV raises when all fits of the batch failed (e.g. invalid parameter combinations), 
+                #   the batch gets no scores, as failed candidates in a single RandomizedSearchCV (error_score=np.nan)
+                print("All candidates of batch failed:", e)
+                new_fold_scores = [(params, fold, np.nan) for params in batch_to_fit for fold in range(n_folds)]
+            if trial_store is not None:
+                trial_store.add_fold_scores(new_fold_scores)
+            fold_scores.update({(models.get_params_key(params), fold): score for params, fold, score in new_fold_scores})
+
+        # Stop if the best candidate so far has no realistic chance to beat score_to_beat
+        mean_scores, sd_scores = models.get_mean_and_sd_scores(candidates[:batch_start + len(batch)], fold_scores, n_folds)
+        if np.isnan(mean_scores).all():
+            continue
+        best_index = np.nanargmax(mean_scores)
+        if batch_start + len(batch) < len(candidates) and cant_beat_score(mean_scores[best_index], sd_scores[best_index], score_to_beat):
+            print(f"Stopping search after {batch_start + len(batch)} of {len(candidates)} candidates: best score {mean_scores[best_index]:.3f} (SD {sd_scores[best_index]:.3f}), score to beat {score_to_beat:.3f}")
+            break
+
+    if np.isnan(mean_scores).all():
+        raise ValueError(f"All {len(candidates)} candidates failed")
+
+    best_estimator = clone(base_model).set_params(**candidates[best_index])
+    best_estimator.fit(X, y)
+
+    return best_estimator, mean_scores[best_index], sd_scores[best_index]
@@ -0,0 +1,103 @@
+import copy
+import numpy as np
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import make_pipeline
+from sklearn.base import clone
+from sklearn.metrics import roc_auc_score
+
+# Imputed and scaled data computed once per fold (or once on all rows), shared by all feature subsets.
+#   Median imputation and standard scaling work column by column, so the preprocessed data of a subset of features
+#   is the same columns of the preprocessed data of all features: subsets only slice the cached matrices.
+#   Matrices are stored column-major (Fortran order), so the columns of a subset are contiguous blocks.
+
+def make_preprocessing():
+    # Same preprocessing as the pipelines of train_models.py and of the models on feature subsets
+    return make_pipeline(SimpleImputer(missing_values=np.nan, strategy='median'), StandardScaler())
+
+def get_output_indices(imputer, column_indices):
+    # Columns with no values in the rows the imputer was fitted on are dropped by the imputer (as when fitting on the subset),
+    #   output index of each remaining column
+    has_values = ~np.isnan(imputer.statistics_)
+    output_indices = np.cumsum(has_values) - 1
+    return np.array([output_indices[column] for column in column_indices if has_values[column]], dtype=int)
+
+class FoldTransformCache:
+    # Preprocessed train and validation matrices of each fold of cv on X, and of all rows of X (for final fits)
+    def __init__(self, X, y, cv=None):
+        self.X = X
+        self.y = y
+        self.column_indices = {column: i for i, column in enumerate(X.columns)}
+
+        self.folds_ = []
+        if cv is not None:
+            y_values = np.asarray(y)
+            for train_index, val_index in cv.split(X, y):
+                preprocessing = make_preprocessing().fit(X.iloc[train_index], y.iloc[train_index])
+                self.folds_.append({"preprocessing": preprocessing,
+                                    "X_train": np.asfortranarray(preprocessing.transform(X.iloc[train_index])), "y_train": y_values[train_index],
+                                    "X_val": np.asfortranarray(preprocessing.transform(X.iloc[val_index])), "y_val": y_values[val_index]})
+        self.all_rows_ = None
+
+    def get_all_rows_preprocessing(self):
+        # Only computed if needed (final fits)
+        if self.all_rows_ is None:
+            preprocessing = make_preprocessing().fit(self.X, self.y)
+            self.all_rows_ = {"preprocessing": preprocessing, "X": np.asfortranarray(preprocessing.transform(self.X)), "y": np.asarray(self.y)}
+        return self.all_rows_
+
+    def get_column_indices(self, features):
+        return [self.column_indices[feature] for feature in features]
+
+    def get_fold(self, fold, features):
+        # X_train, y_train, X_val, y_val of the fold with only the features
+        fold = self.folds_[fold]
+        output_indices = get_output_indices(fold["preprocessing"][0], self.get_column_indices(features))
+        return fold["X_train"][:, output_indices], fold["y_train"], fold["X_val"][:, output_indices], fold["y_val"]
+
+    def get_folds(self, features):
+        return [self.get_fold(fold, features) for fold in range(len(self.folds_))]
+
+    def get_all_rows(self, features):
+        all_rows = self.get_all_rows_preprocessing()
+        output_indices = get_output_indices(all_rows["preprocessing"][0], self.get_column_indices(features))
+        return all_rows["X"][:, output_indices], all_rows["y"]
+
+    def get_fitted_preprocessing(self, features):
+        # Imputer and scaler fitted on all rows, sliced to the features: same as fitting them on X[features]
+        preprocessing = self.get_all_rows_preprocessing()["preprocessing"]
+        column_indices = self.get_column_indices(features)
+        output_indices = get_output_indices(preprocessing[0], column_indices)
+        imputer, scaler = copy.deepcopy(preprocessing[0]), copy.deepcopy(preprocessing[1])
+
+        imputer.statistics_ = imputer.statistics_[column_indices]
+        imputer.n_features_in_ = len(column_indices)
+        imputer.feature_names_in_ = imputer.feature_names_in_[column_indices]
+
+        for attribute in ["mean_", "var_", "scale_", "n_samples_seen_"]:
+            value = getattr(scaler, attribute, None)
+            if isinstance(value, np.ndarray) and value.ndim == 1:
+                setattr(scaler, attribute, value[output_indices])
+        scaler.n_features_in_ = len(output_indices)
+
+        return imputer, scaler
+
+    def fit_estimator(self, estimator, features):
+        # Sliced preprocessing and the estimator fitted on the cached matrix,
+        #   same pipeline as make_pipeline(SimpleImputer, StandardScaler, estimator).fit(X[features], y)
+        X, y = self.get_all_rows(features)
+        return make_pipeline(*self.get_fitted_preprocessing(features), clone(estimator).fit(X, y))
+
+    def cross_val_score(self, estimator, features):
+        # ROC AUC on each fold, same as cross_val_score(pipeline, X[features], y, cv=cv, scoring="roc_auc")
+        scores = []
+        for X_train, y_train, X_val, y_val in self.get_folds(features):
+            fold_estimator = clone(estimator).fit(X_train, y_train)
+            scores.append(roc_auc_score(y_val, get_scores_for_roc_auc(fold_estimator, X_val)))
+        return np.array(scores)
+
+def get_scores_for_roc_auc(estimator, X):
+    # Same response as the "roc_auc" scorer: decision function if the estimator has one, probabilities otherwise
+    if hasattr(estimator, "decision_function"):
+        return estimator.decision_function(X)
+    return estimator.predict_proba(X)[:, 1]
@@ -1,4 +1,5 @@
 from sklearn.feature_selection import RFE
+from sklearn.base import clone
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler
 
@@ -12,6 +13,10 @@ parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 import models, util
 
+RFE_SCHEDULE = True # Scheduled elimination (see get_feature_ranking_with_schedule). False: sklearn RFE with step=1 down to 1 feature
+RFE_FRACTION_STEP = 0.1 # Fraction of remaining features removed per fit while far from the cutoff
+RFE_STEP_1_MARGIN = 10 # Number of features above the cutoff from which features are removed one at a time
+
 def transform_data_for_rfe(diag, datasets):
     imputer = SimpleImputer(missing_values=np.nan, strategy='median')
     scaler = StandardScaler()
@@ -33,13 +38,53 @@ def get_rfe_object(diag, best_estimators, datasets):
     selector = selector.fit(X_train, y_train)
     return selector
 
-def get_feature_ranking_from_rfe(diag, best_estimators, datasets):
-    rfe_object = get_rfe_object(diag, best_estimators, datasets)
+def get_feature_importances(estimator):
+    # Same importances as RFE: absolute coefficients (LR, linear SVC) or feature importances (RF)
+    if hasattr(estimator, "coef_"):
+        return np.abs(estimator.coef_).sum(axis=0)
+    return estimator.feature_importances_
+
+def get_feature_ranking_with_schedule(estimator, X, y, number_of_features_to_check):
+    # Recursive feature elimination that only ranks what is used (the first number_of_features_to_check features):
+    #   removes RFE_FRACTION_STEP of the remaining features per fit while far from the cutoff, one at a time for the last
+    #   RFE_STEP_1_MARGIN features above it, and ranks the remaining features by the importances of the last fit.
+    #   Ranks are distinct: features removed in the same fit are ranked by their importance in that fit.
+    remaining = np.arange(X.shape[1])
+    elimination_order = [] # Least important first
+    n_fits = 0
+    while True:
+        fitted_estimator = clone(estimator).fit(X[:, remaining], y)
+        n_fits += 1
+        order = np.argsort(get_feature_importances(fitted_estimator), kind="stable")
+        n_to_remove = len(remaining) - number_of_features_to_check
+        if n_to_remove <= 0:
+            elimination_order += list(remaining[order])
+            break
+        if n_to_remove > RFE_STEP_1_MARGIN:
+            n_to_remove = min(max(1, int(RFE_FRACTION_STEP * len(remaining))), n_to_remove - RFE_STEP_1_MARGIN)
+        else:
+            n_to_remove = 1
+        elimination_order += list(remaining[order[:n_to_remove]])
+        remaining = np.sort(remaining[order[n_to_remove:]])
+    print(f"Scheduled RFE: {n_fits} fits for {X.shape[1]} features")
+
+    ranking = np.empty(X.shape[1], dtype=int)
+    ranking[elimination_order[::-1]] = np.arange(1, X.shape[1] + 1)
+    return ranking
+
+def get_feature_ranking_from_rfe(diag, best_estimators, datasets, number_of_features_to_check):
+    # Only the first number_of_features_to_check ranks are exact with RFE_SCHEDULE (features after the cutoff are ranked by batch)
     X_train = datasets[diag]["X_train_train"]
-    return pd.DataFrame(rfe_object.ranking_, index=X_train.columns, columns=["Rank"]).sort_values(by="Rank", ascending=True)
+    if RFE_SCHEDULE:
+        X_train_transformed, y_train = transform_data_for_rfe(diag, datasets)
+        estimator = util.get_estimator_from_pipeline(best_estimators[diag])
+        ranking = get_feature_ranking_with_schedule(estimator, X_train_transformed, y_train, number_of_features_to_check)
+    else:
+        ranking = get_rfe_object(diag, best_estimators, datasets).ranking_
+    return pd.DataFrame(ranking, index=X_train.columns, columns=["Rank"]).sort_values(by="Rank", ascending=True)
 
 def get_first_n_features_from_rfe(diag, best_estimators, datasets, number_of_features_to_check):
-    feature_ranking = get_feature_ranking_from_rfe(diag, best_estimators, datasets)
+    feature_ranking = get_feature_ranking_from_rfe(diag, best_estimators, datasets, number_of_features_to_check)
     best_n_features_from_rfe = feature_ranking[feature_ranking["Rank"] <= number_of_features_to_check].index.tolist()
     return best_n_features_from_rfe
 
@@ -50,5 +95,5 @@ def get_feature_subsets_from_rfe_then_sfs(diag, best_estimators, datasets, numbe
     X_train_top_n_features, y_train = datasets[diag]["X_train_train"][best_n_features_from_rfe], datasets[diag]["y_train_train"]
 
     # Use SFS to sort first n features
-    feature_subsets = models.get_feature_subsets_from_sfs(diag, best_estimators, number_of_features_to_check, X_train_top_n_features, y_train)
-    return feature_subsets
\ No newline at end of file
+    feature_subsets, stopping_info = models.get_feature_subsets_from_sfs(diag, best_estimators, number_of_features_to_check, X_train_top_n_features, y_train)
+    return feature_subsets, stopping_info
\ No newline at end of file
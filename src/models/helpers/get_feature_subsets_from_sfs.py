@@ -1,6 +1,27 @@
+import numpy as np
+import pandas as pd
 from sklearn.model_selection import StratifiedKFold
 
+# To import from parent directory
+import os, sys, inspect
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+import models, util
+
 DEBUG_MODE = True
+SFS_ENGINE = "native" # "native": models.LRForwardSelector for logistic regression (warm-started, preprocessing once per fold), "mlxtend": mlxtend for all models
+LR_SFS_RACING = True # Logistic regression only (native engine, other models always score all folds): score candidates fold by fold, stop scoring the ones clearly behind the best candidate
+LR_RACING_Z = 2.0 # Candidates are dropped when their mean fold score difference to the best candidate is more than LR_RACING_Z standard errors
+LR_SATURATION_PATIENCE = 10 # Logistic regression only (native engine, other models always go to number_of_features_to_check): stop adding features when the best CV AUC improved by less than LR_SATURATION_MARGIN in the last LR_SATURATION_PATIENCE steps (None: always go to number_of_features_to_check)
+LR_SATURATION_MARGIN = 0.005
+
+def get_X_without_nullable_dtypes(X):
+    # mlxtend passes X to the pipeline as an object array, SimpleImputer can't read pd.NA from nullable (e.g. Int8) columns
+    nullable_cols = [col for col, dtype in X.dtypes.items() if isinstance(dtype, pd.api.extensions.ExtensionDtype)]
+    if not nullable_cols:
+        return X
+    return X.astype({col: np.float64 for col in nullable_cols})
 
 def get_sfs_object(diag, best_estimators, number_of_features_to_check, X_train, y_train):
     from mlxtend.feature_selection import SequentialFeatureSelector
@@ -9,6 +30,12 @@ def get_sfs_object(diag, best_estimators, number_of_features_to_check, X_train,
     diag_estimator = best_estimators[diag]
 
     cv = StratifiedKFold(n_splits=2 if DEBUG_MODE else 8)
+    if SFS_ENGINE == "native" and util.get_base_model_name_from_pipeline(diag_estimator) == "logisticregression":
+        sfs = models.LRForwardSelector(diag_estimator, k_features=number_of_features_to_check, cv=cv, floating=True, 
+                                        racing=LR_SFS_RACING, racing_z=LR_RACING_Z, saturation_margin=LR_SATURATION_MARGIN, saturation_patience=LR_SATURATION_PATIENCE,
+                                        n_jobs=-1, verbose=1)
+        return sfs.fit(X_train, y_train)
+
     sfs = SequentialFeatureSelector(diag_estimator, 
         k_features=number_of_features_to_check,
         forward=True, 
@@ -18,7 +45,7 @@ def get_sfs_object(diag, best_estimators, number_of_features_to_check, X_train,
         verbose=1,
         n_jobs=-1)
 
-    sfs = sfs.fit(X_train, y_train)
+    sfs = sfs.fit(get_X_without_nullable_dtypes(X_train), y_train)
 
     return sfs
 
@@ -26,9 +53,18 @@ def get_top_n_feaures_from_sfs_object(n, sfs_object):
     features_up_top_n = sfs_object.subsets_[n]["feature_names"]
     return list(features_up_top_n)
 
+def get_stopping_info_from_sfs_object(sfs_object):
+    # Where selection stopped (models.LRForwardSelector can stop early when the CV AUC saturates, mlxtend always goes to k_features)
+    if hasattr(sfs_object, "stopping_"):
+        return sfs_object.stopping_
+    best_n_features = max(sfs_object.subsets_, key=lambda k: sfs_object.subsets_[k]["avg_score"])
+    return {"stopped_early": False, "n_features_checked": max(sfs_object.subsets_), "k_features": max(sfs_object.subsets_),
+            "best_n_features": int(best_n_features), "best_score": float(sfs_object.subsets_[best_n_features]["avg_score"])}
+
 def get_feature_subsets_from_sfs(diag, best_estimators, number_of_features_to_check, X_train, y_train):
+    # Returns feature subsets for each number of features checked, and where selection stopped
     feature_subsets = {}
     sfs_object = get_sfs_object(diag, best_estimators, number_of_features_to_check, X_train, y_train)
-    for n in range(1, number_of_features_to_check+1):
+    for n in sorted(sfs_object.subsets_.keys()):
         feature_subsets[n] = get_top_n_feaures_from_sfs_object(n, sfs_object)
-    return feature_subsets
\ No newline at end of file
+    return feature_subsets, get_stopping_info_from_sfs_object(sfs_object)
\ No newline at end of file
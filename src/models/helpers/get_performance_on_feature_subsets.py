@@ -5,14 +5,10 @@ from IPython.core import ultratb
 sys.excepthook = ultratb.FormattedTB(color_scheme='Neutral', call_pdb=False)
 
 import numpy as np
-import math
 
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import make_pipeline
 from sklearn.base import clone
-from sklearn.model_selection import StratifiedKFold, cross_val_score
-from sklearn.metrics import confusion_matrix
+from sklearn.model_selection import StratifiedKFold
+from sklearn.metrics import confusion_matrix, roc_auc_score
 
 # To import from parent directory
 currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
@@ -29,37 +25,10 @@ def get_best_thresholds(best_estimators, datasets):
 
 def get_matrix_metrics(real_values,pred_values):
     CM = confusion_matrix(real_values,pred_values)
-    TN = CM[0][0]+0.01 # +0.01 To avoid division by 0 errors
-    FN = CM[1][0]+0.01
-    TP = CM[1][1]+0.01
-    FP = CM[0][1]+0.01
-    Population = TN+FN+TP+FP
-    Prevalence = round( (TP+FN) / Population,2)
-    Accuracy   = round( (TP+TN) / Population,4)
-    Precision  = round( TP / (TP+FP),4 )
-    NPV        = round( TN / (TN+FN),4 )
-    FDR        = round( FP / (TP+FP),4 )
-    FOR        = round( FN / (TN+FN),4 ) 
-    check_Pos  = Precision + FDR
-    check_Neg  = NPV + FOR
-    Recall     = round( TP / (TP+FN),4 )
-    FPR        = round( FP / (TN+FP),4 )
-    FNR        = round( FN / (TP+FN),4 )
-    TNR        = round( TN / (TN+FP),4 ) 
-    check_Pos2 = Recall + FNR
-    check_Neg2 = FPR + TNR
-    LRPos      = round( Recall/FPR,4 ) 
-    LRNeg      = round( FNR / TNR ,4 )
-    #DOR        = round( LRPos/LRNeg)
-    DOR        = 1 # FIX, LINE ABOVE
-    F1         = round ( 2 * ((Precision*Recall)/(Precision+Recall)),4)
-    MCC        = round ( ((TP*TN)-(FP*FN))/math.sqrt((TP+FP)*(TP+FN)*(TN+FP)*(TN+FN))  ,4)
-    BM         = Recall+TNR-1
-    MK         = Precision+NPV-1   
-    Predicted_Positive_Ratio = round( (TP+FP) / Population,2)
+    metrics = models.get_matrix_metrics_from_counts(CM[1][1], CM[0][0], CM[0][1], CM[1][0])
     
-    mat_met = [TP,TN,FP,FN,Prevalence,Accuracy,Precision,NPV,FDR,FOR,check_Pos,check_Neg,Recall,FPR,FNR,TNR,check_Pos2,check_Neg2,LRPos,LRNeg,DOR,F1,MCC,BM,MK,Predicted_Positive_Ratio]
-    metric_names = ['TP','TN','FP','FN','Prevalence','Accuracy','PPV (Precision)','NPV','FDR','FOR','check_Pos','check_Neg','Recall (Sensitivity)','FPR','FNR','TNR (Specificity)','check_Pos2','check_Neg2','LR+','LR-','DOR','F1','MCC','BM','MK','Predicted Positive Ratio','ROC AUC']   
+    mat_met = [metrics[name].item() for name in models.METRIC_NAMES]
+    metric_names = models.METRIC_NAMES + ['ROC AUC']
 
     return (mat_met, metric_names)
 
@@ -75,6 +44,28 @@ def get_metrics(estimator, threshold, X, y):
     
     return metrics, metric_names
 
+def get_metrics_at_all_thresholds(estimator, thresholds, X, y):
+    # Same metrics as get_metrics() at every threshold, but predicting only once
+    y_pred_prob = estimator.predict_proba(X)[:,1]
+    roc_auc = roc_auc_score(y, y_pred_prob)
+
+    metrics = models.get_matrix_metrics_at_thresholds(y, y_pred_prob, thresholds)
+    sensitivities = metrics["Recall (Sensitivity)"]
+    specificities = metrics["TNR (Specificity)"]
+    ppvs = metrics["PPV (Precision)"]
+    npvs = metrics["NPV"]
+
+    metrics_at_thresholds = {}
+    for i, threshold in enumerate(thresholds):
+        metrics_at_thresholds[threshold] = [
+            roc_auc, 
+            sensitivities[i], 
+            specificities[i], 
+            ppvs[i], 
+            npvs[i]]
+    
+    return metrics_at_thresholds
+
 def get_cv_scores_on_feature_subsets(feature_subsets, datasets, best_estimators):
     cv_scores_on_feature_subsets = {}
     
@@ -82,11 +73,12 @@ def get_cv_scores_on_feature_subsets(feature_subsets, datasets, best_estimators)
         if diag in datasets.keys():
             print("Getting CV scores on feature subsets for " + diag + " (" + str(i+1) + "/" + str(len(feature_subsets)) + ")")
             cv_scores_on_feature_subsets[diag] = []
+            X_train, y_train = datasets[diag]["X_train"], datasets[diag]["y_train"]
+            # Impute and scale each fold once, each subset uses its columns
+            fold_transform_cache = models.FoldTransformCache(X_train, y_train, cv = StratifiedKFold(n_splits=8))
             for nb_features in feature_subsets[diag].keys():
-                X_train, y_train = datasets[diag]["X_train"], datasets[diag]["y_train"]
                 top_n_features = models.get_top_n_features(feature_subsets, diag, nb_features)
-                new_estimator = make_pipeline(SimpleImputer(missing_values=np.nan, strategy='median'), StandardScaler(), clone(best_estimators[diag][2]))
-                cv_scores = cross_val_score(new_estimator, X_train[top_n_features], y_train, cv = StratifiedKFold(n_splits=8), scoring='roc_auc')
+                cv_scores = fold_transform_cache.cross_val_score(clone(best_estimators[diag][2]), top_n_features)
                 cv_scores_on_feature_subsets[diag].append(cv_scores.mean())
     return cv_scores_on_feature_subsets
 
@@ -136,16 +128,8 @@ def get_performances_on_feature_subsets_per_output(diag, feature_subsets, estima
             new_estimator = estimators_on_feature_subsets[diag][nb_features]
             thresholds = thresholds_on_feature_subsets[diag][nb_features][0]
             optimal_thresholds[nb_features] = thresholds_on_feature_subsets[diag][nb_features][1]
-            metrics_on_subsets[nb_features] = {}
-            for threshold in thresholds:
-                metrics, metric_names = get_metrics(new_estimator, threshold, X_test[top_n_features], y_test)
-                relevant_metrics = [
-                    metrics[-1], # AUC ROC
-                    metrics[metric_names.index("Recall (Sensitivity)")],
-                    metrics[metric_names.index("TNR (Specificity)")],
-                    metrics[metric_names.index("PPV (Precision)")],
-                    metrics[metric_names.index("NPV")]]
-                metrics_on_subsets[nb_features][threshold] = relevant_metrics
+            # AUC ROC, Sensitivity, Specificity, PPV, NPV for each threshold
+            metrics_on_subsets[nb_features] = get_metrics_at_all_thresholds(new_estimator, thresholds, X_test[top_n_features], y_test)
         
     return metrics_on_subsets, optimal_thresholds
 
@@ -0,0 +1,152 @@
+import numpy as np
+from scipy import stats
+from sklearn.base import clone
+from sklearn.metrics import roc_auc_score
+from joblib import Parallel, delayed
+
+# To import from parent directory
+import os, sys, inspect
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+import models
+
+# Sequential forward (floating) feature selection for logistic regression pipelines, same steps as mlxtend's
+#   SequentialFeatureSelector(forward=True, floating=True, scoring="roc_auc"), and same subsets_ structure.
+#   Imputed and scaled folds come from models.FoldTransformCache (computed once, sliced for each subset),
+#   and each candidate subset is warm-started from the coefficients of the subset it was made from.
+#   With racing, candidates are scored fold by fold and the ones clearly behind the leader are not scored on the remaining folds.
+#   With saturation_patience, selection stops before k_features once the best score has improved by less than
+#   saturation_margin over the last saturation_patience steps (subsets_ then only has the sizes reached).
+
+def score_fold(lr, fold, warm_start_coef):
+    # Fit LR on the fold (already sliced to the subset of features), starting from warm_start_coef (coefficients and intercept)
+    X_train, y_train, X_val, y_val = fold
+    fold_lr = clone(lr)
+    # No warm start if the imputer dropped a column with no values in the fold
+    if warm_start_coef is not None and len(warm_start_coef[0]) == X_train.shape[1]:
+        fold_lr.coef_ = warm_start_coef[0].reshape(1, -1)
+        fold_lr.intercept_ = np.array([warm_start_coef[1]])
+    fold_lr.fit(X_train, y_train)
+    return roc_auc_score(y_val, fold_lr.decision_function(X_val)), (fold_lr.coef_[0].copy(), fold_lr.intercept_[0])
+
+def get_candidates_still_in_race(scores, candidates, z):
+    # Racing: scores (candidates x folds scored so far) are paired by fold, a candidate is dropped when its mean
+    #   difference to the leader is above 0 with the one-sided confidence of z (it can't plausibly catch up on the remaining folds).
+    #   The SD is estimated on few folds, so the bound uses the t distribution with the same confidence as z.
+    n_folds = scores.shape[1]
+    leader = np.argmax(scores.mean(axis=1))
+    differences = scores[leader] - scores
+    standard_errors = differences.std(axis=1, ddof=1) / np.sqrt(n_folds)
+    is_behind = differences.mean(axis=1) - stats.t.ppf(stats.norm.cdf(z), df=n_folds - 1) * standard_errors > 0
+    return [candidate for candidate, behind in zip(candidates, is_behind) if not behind]
+
+class LRForwardSelector:
+    def __init__(self, estimator, k_features, cv, floating=True, racing=False, racing_z=2.0, racing_min_folds=3,
+                 saturation_margin=0.005, saturation_patience=None, n_jobs=-1, verbose=1):
+        self.estimator = estimator
+        self.k_features = k_features
+        self.cv = cv
+        self.floating = floating
+        self.racing = racing
+        self.racing_z = racing_z
+        self.racing_min_folds = racing_min_folds
+        self.saturation_margin = saturation_margin
+        self.saturation_patience = saturation_patience
+        self.n_jobs = n_jobs
+        self.verbose = verbose
+
+    def record_subset(self, features, scores):
+        # Keep the best subset of each size
+        k = len(features)
+        if k not in self.subsets_ or scores.mean() > self.subsets_[k]["avg_score"]:
+            self.subsets_[k] = {"feature_idx": tuple(sorted(features)), "cv_scores": scores, "avg_score": scores.mean()}
+
+    def is_saturated(self, best_scores):
+        # best_scores: best score of all subsets so far, after each step
+        if self.saturation_patience is None or len(best_scores) <= self.saturation_patience:
+            return False
+        return best_scores[-1] - best_scores[-1 - self.saturation_patience] < self.saturation_margin
+
+    def get_rounds_of_folds(self):
+        # Folds scored together before candidates are raced: first racing_min_folds folds, then one at a time
+        n_folds = len(self.cache_.folds_)
+        if not self.racing or self.racing_min_folds >= n_folds:
+            return [list(range(n_folds))]
+        return [list(range(self.racing_min_folds))] + [[fold] for fold in range(self.racing_min_folds, n_folds)]
+
+    def select(self, parallel, subsets, warm_start_coefs):
+        # Best of candidate subsets: index, scores on folds, fitted coefficients
+        n_folds = len(self.cache_.folds_)
+        scores = np.full((len(subsets), n_folds), np.nan)
+        coefs = [[None] * n_folds for _ in subsets]
+
+        candidates = list(range(len(subsets)))
+        for i, folds in enumerate(self.get_rounds_of_folds()):
+            if i > 0:
+                candidates = get_candidates_still_in_race(scores[candidates, :folds[0]], candidates, self.racing_z)
+            tasks = [(candidate, fold) for candidate in candidates for fold in folds]
+            results = parallel(delayed(score_fold)(self.lr_, self.cache_.get_fold(fold, [self.feature_names_[feature] for feature in subsets[candidate]]), warm_start_coefs[candidate][fold])
+                               for candidate, fold in tasks)
+            for (candidate, fold), (score, coef) in zip(tasks, results):
+                scores[candidate, fold], coefs[candidate][fold] = score, coef
+            self.n_fold_fits_ += len(tasks)
+
+        best_index = candidates[int(np.argmax(scores[candidates].mean(axis=1)))]
+        return best_index, scores[best_index], coefs[best_index]
+
+    def fit(self, X, y):
+        self.feature_names_ = list(X.columns)
+        n_features = len(self.feature_names_)
+        k_features = min(self.k_features, n_features)
+
+        self.cache_ = models.FoldTransformCache(X, y, self.cv)
+        self.lr_ = clone(self.estimator[-1]).set_params(warm_start=True)
+        self.subsets_ = {}
+        self.n_fold_fits_ = 0
+
+        subset = []
+        coefs = [None] * len(self.cache_.folds_)
+        best_scores = []
+        stopped_early = False
+        with Parallel(n_jobs=self.n_jobs) as parallel:
+            while len(subset) < k_features:
+                # Inclusion: add the feature that gives the best score, new coefficient starts at 0
+                candidates = [feature for feature in range(n_features) if feature not in subset]
+                warm_start_coefs = [[None if coef is None else (np.append(coef[0], 0), coef[1]) for coef in coefs]] * len(candidates)
+                best_index, scores, coefs = self.select(parallel, [subset + [feature] for feature in candidates], warm_start_coefs)
+                new_feature = candidates[best_index]
+                subset = subset + [new_feature]
+                score = scores.mean()
+                self.record_subset(subset, scores)
+
+                # Conditional exclusion: remove a feature (not the new one) while that beats the best subset of that size
+                while self.floating and len(subset) > 2:
+                    positions = [position for position, feature in enumerate(subset) if feature != new_feature]
+                    warm_start_coefs = [[(np.delete(coef[0], position), coef[1]) for coef in coefs] for position in positions]
+                    best_index, exclusion_scores, exclusion_coefs = self.select(parallel, [subset[:position] + subset[position+1:] for position in positions], warm_start_coefs)
+                    exclusion_score = exclusion_scores.mean()
+                    if exclusion_score <= score or exclusion_score <= self.subsets_[len(subset) - 1]["avg_score"]:
+                        break
+                    subset = subset[:positions[best_index]] + subset[positions[best_index]+1:]
+                    coefs, score = exclusion_coefs, exclusion_score
+                    self.record_subset(subset, exclusion_scores)
+
+                if self.verbose:
+                    print(f"Features: {len(subset)}/{k_features}, score: {score:.3f}, fold fits so far: {self.n_fold_fits_}")
+
+                best_scores.append(max(subset_info["avg_score"] for subset_info in self.subsets_.values()))
+                if len(subset) < k_features and self.is_saturated(best_scores):
+                    stopped_early = True
+                    if self.verbose:
+                        print(f"Stopping at {len(subset)} features: best score improved by less than {self.saturation_margin} in the last {self.saturation_patience} steps")
+                    break
+
+        for k in self.subsets_:
+            self.subsets_[k]["feature_names"] = tuple(self.feature_names_[feature] for feature in self.subsets_[k]["feature_idx"])
+
+        best_n_features = max(self.subsets_, key=lambda k: self.subsets_[k]["avg_score"])
+        self.stopping_ = {"stopped_early": stopped_early, "n_features_checked": max(self.subsets_), "k_features": k_features,
+                          "best_n_features": int(best_n_features), "best_score": float(self.subsets_[best_n_features]["avg_score"]),
+                          "saturation_margin": self.saturation_margin, "saturation_patience": self.saturation_patience}
+        return self
@@ -0,0 +1,99 @@
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterSampler
+from joblib import Parallel, delayed
+
+# To import from parent directory
+import os, sys, inspect
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+import models
+
+# Search for logistic regression along regularization paths: for each sampled (penalty, l1_ratio, class_weight),
+#   C values are fitted in increasing order, each fit warm-started from the solution for the previous C.
+#   Imputer and scaler are fitted once per fold. Scores are CV ROC AUC mean and SD, same as RandomizedSearchCV.
+#   Fold scores can be kept in a trial store (trial_store.py).
+
+N_C_VALUES_PER_PATH = 10
+
+def sample_paths(grid, n_iter, random_state=None):
+    # n_iter candidates in total: n_iter / N_C_VALUES_PER_PATH paths with N_C_VALUES_PER_PATH values of C each
+    n_paths = max(1, n_iter // N_C_VALUES_PER_PATH)
+    path_grid = {param: values for param, values in grid.items() if param != "logisticregression__C"}
+    path_params = list(ParameterSampler(path_grid, n_iter=n_paths, random_state=random_state))
+
+    rng = np.random.RandomState(random_state)
+    c_distribution = grid["logisticregression__C"]
+    paths = []
+    for params in path_params:
+        if hasattr(c_distribution, "rvs"):
+            c_values = c_distribution.rvs(size=N_C_VALUES_PER_PATH, random_state=rng)
+        else:
+            c_values = rng.choice(c_distribution, size=N_C_VALUES_PER_PATH)
+        paths.append((params, np.sort(c_values)))
+    return paths
+
+def preprocess_fold(base_model, X, y, train_index, val_index):
+    preprocessing = clone(base_model[:-1])
+    X_train = preprocessing.fit_transform(X.iloc[train_index], y.iloc[train_index])
+    X_val = preprocessing.transform(X.iloc[val_index])
+    return X_train, y.iloc[train_index].to_numpy(), X_val, y.iloc[val_index].to_numpy()
+
+def get_scores_on_path(base_model, params, c_values, fold):
+    X_train, y_train, X_val, y_val = fold
+
+    lr = clone(base_model[-1])
+    lr.set_params(**{param.replace("logisticregression__", ""): value for param, value in params.items()}, warm_start=True)
+
+    scores = []
+    try:
+        for c in c_values:
+            lr.set_params(C=c)
+            lr.fit(X_train, y_train)
+            scores.append(roc_auc_score(y_val, lr.decision_function(X_val)))
+    except ValueError as e:
+        # Invalid parameter combinations get no score from the failed fit on, as with error_score=np.nan in sklearn searches
+        print("Path", params, "failed:", e)
+        scores += [np.nan] * (len(c_values) - len(scores))
+    return scores
+
+def get_path_candidates(params, c_values):
+    return [{**params, "logisticregression__C": c} for c in c_values]
+
+def get_best_lr_on_c_paths(base_model, grid, cv, n_iter, X, y, n_jobs=-1, trial_store=None, random_state=None):
+    paths = sample_paths(grid, n_iter, random_state)
+    n_folds = cv.get_n_splits()
+
+    # With a trial store (models.TrialStore), scores of (path, fold) found in the store are not recomputed
+    fold_scores = trial_store.get_fold_scores() if trial_store is not None else {}
+    paths_and_folds_to_fit = [(path_index, fold) for path_index, (params, c_values) in enumerate(paths) for fold in range(n_folds)
+                              if any((models.get_params_key(candidate), fold) not in fold_scores for candidate in get_path_candidates(params, c_values))]
+
+    if len(paths_and_folds_to_fit) > 0:
+        folds = [preprocess_fold(base_model, X, y, train_index, val_index) for train_index, val_index in cv.split(X, y)]
+
+        print("Fitting", len(paths), "C paths of", N_C_VALUES_PER_PATH, "values on", n_folds, "folds", 
+              f"({len(paths) * n_folds - len(paths_and_folds_to_fit)} path and fold pairs found in trial store)" if trial_store is not None else "")
+        path_scores = Parallel(n_jobs=n_jobs, return_as="generator")(delayed(get_scores_on_path)(base_model, paths[path_index][0], paths[path_index][1], folds[fold])
+                                                                     for (path_index, fold) in paths_and_folds_to_fit)
+        
+        # Save scores as they come, so they are kept if the search is interrupted
+        for (path_index, fold), scores in zip(paths_and_folds_to_fit, path_scores):
+            new_fold_scores = [(candidate, fold, score) for candidate, score in zip(get_path_candidates(*paths[path_index]), scores)]
+            if trial_store is not None:
+                trial_store.add_fold_scores(new_fold_scores)
+            fold_scores.update({(models.get_params_key(candidate), fold): score for candidate, fold, score in new_fold_scores})
+
+    # Scores of each candidate (path, C) on each fold
+    candidates = [candidate for params, c_values in paths for candidate in get_path_candidates(params, c_values)]
+    mean_scores, sd_scores = models.get_mean_and_sd_scores(candidates, fold_scores, n_folds)
+    if np.isnan(mean_scores).all():
+        raise ValueError(f"All {len(candidates)} candidates failed")
+    best_index = np.nanargmax(mean_scores)
+
+    best_estimator = clone(base_model).set_params(**candidates[best_index])
+    best_estimator.fit(X, y)
+
+    return best_estimator, mean_scores[best_index], sd_scores[best_index]
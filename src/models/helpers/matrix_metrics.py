@@ -0,0 +1,68 @@
+import numpy as np
+
+METRIC_NAMES = ['TP','TN','FP','FN','Prevalence','Accuracy','PPV (Precision)','NPV','FDR','FOR','check_Pos','check_Neg','Recall (Sensitivity)','FPR','FNR','TNR (Specificity)','check_Pos2','check_Neg2','LR+','LR-','DOR','F1','MCC','BM','MK','Predicted Positive Ratio']
+
+def get_confusion_matrices_at_thresholds(y, y_pred_prob, thresholds):
+    # Confusion matrix counts at every threshold in one pass: sort predicted probabilities once, 
+    #   the number of positive predictions at threshold t is the number of probabilities >= t
+    y = np.asarray(y).astype(int)
+    order = np.argsort(y_pred_prob, kind="mergesort")
+    y_pred_prob_sorted = y_pred_prob[order]
+    cumul_positives = np.concatenate([[0], np.cumsum(y[order])]) # cumul_positives[i] = number of positives among the i lowest probabilities
+
+    n_positives = cumul_positives[-1]
+    n_negatives = len(y) - n_positives
+    
+    first_predicted_positive = np.searchsorted(y_pred_prob_sorted, thresholds, side="left")
+    FN = cumul_positives[first_predicted_positive]
+    TN = first_predicted_positive - FN
+    TP = n_positives - FN
+    FP = n_negatives - TN
+
+    return TP, TN, FP, FN
+
+def get_matrix_metrics_from_counts(TP, TN, FP, FN, smoothing=0.01, round_metrics=True):
+    # Batched version of get_matrix_metrics: TP, TN, FP, FN are arrays of any (same) shape, e.g. 
+    #   thresholds x subsets x diagnoses, every metric is returned as an array of that shape
+
+    # Round like get_matrix_metrics if round_metrics, otherwise keep full precision
+    def rnd(values, decimals):
+        return np.round(values, decimals) if round_metrics else values
+
+    TP = np.asarray(TP, dtype=float) + smoothing # Smoothing to avoid division by 0 errors
+    TN = np.asarray(TN, dtype=float) + smoothing
+    FP = np.asarray(FP, dtype=float) + smoothing
+    FN = np.asarray(FN, dtype=float) + smoothing
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Population = TN+FN+TP+FP
+        Prevalence = rnd( (TP+FN) / Population,2)
+        Accuracy   = rnd( (TP+TN) / Population,4)
+        Precision  = rnd( TP / (TP+FP),4 )
+        NPV        = rnd( TN / (TN+FN),4 )
+        FDR        = rnd( FP / (TP+FP),4 )
+        FOR        = rnd( FN / (TN+FN),4 ) 
+        check_Pos  = Precision + FDR
+        check_Neg  = NPV + FOR
+        Recall     = rnd( TP / (TP+FN),4 )
+        FPR        = rnd( FP / (TN+FP),4 )
+        FNR        = rnd( FN / (TP+FN),4 )
+        TNR        = rnd( TN / (TN+FP),4 ) 
+        check_Pos2 = Recall + FNR
+        check_Neg2 = FPR + TNR
+        LRPos      = rnd( Recall/FPR,4 ) 
+        LRNeg      = rnd( FNR / TNR ,4 )
+        DOR        = np.ones_like(TP) # Same as in get_matrix_metrics
+        F1         = rnd ( 2 * ((Precision*Recall)/(Precision+Recall)),4)
+        MCC        = rnd ( ((TP*TN)-(FP*FN))/np.sqrt((TP+FP)*(TP+FN)*(TN+FP)*(TN+FN))  ,4)
+        BM         = Recall+TNR-1
+        MK         = Precision+NPV-1   
+        Predicted_Positive_Ratio = rnd( (TP+FP) / Population,2)
+    
+    mat_met = [TP,TN,FP,FN,Prevalence,Accuracy,Precision,NPV,FDR,FOR,check_Pos,check_Neg,Recall,FPR,FNR,TNR,check_Pos2,check_Neg2,LRPos,LRNeg,DOR,F1,MCC,BM,MK,Predicted_Positive_Ratio]
+
+    return dict(zip(METRIC_NAMES, mat_met))
+
+def get_matrix_metrics_at_thresholds(y, y_pred_prob, thresholds, smoothing=0.01, round_metrics=True):
+    TP, TN, FP, FN = get_confusion_matrices_at_thresholds(y, y_pred_prob, thresholds)
+    return get_matrix_metrics_from_counts(TP, TN, FP, FN, smoothing, round_metrics)
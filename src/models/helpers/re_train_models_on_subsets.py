@@ -1,16 +1,16 @@
-
-import numpy as np
-
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import make_pipeline
 from sklearn.base import clone
 
-def fit_estimator_on_subset_of_features(best_estimators, diag, X, y):
+# To import from parent directory
+import os, sys, inspect
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+import models
+
+def fit_estimator_on_subset_of_features(best_estimators, diag, fold_transform_cache, features):
+    # Imputer and scaler fitted once on all features (models.FoldTransformCache), sliced to the subset
     new_estimator_base = clone(best_estimators[diag][2])
-    new_estimator = make_pipeline(SimpleImputer(missing_values=np.nan, strategy='median'), StandardScaler(), new_estimator_base)
-    new_estimator.fit(X, y)
-    return new_estimator
+    return fold_transform_cache.fit_estimator(new_estimator_base, features)
 
 def get_top_n_features(feature_subsets, diag, n):
     features_up_top_n = feature_subsets[diag][n]
@@ -20,12 +20,13 @@ def re_train_models_on_feature_subsets_per_output(diag, feature_subsets, dataset
     estimators_on_feature_subsets = {}
 
     if diag in datasets.keys():
+        X_train, y_train = datasets[diag]["X_train_train"], datasets[diag]["y_train_train"]
+        fold_transform_cache = models.FoldTransformCache(X_train, y_train)
         for nb_features in feature_subsets[diag].keys():
-            X_train, y_train = datasets[diag]["X_train_train"], datasets[diag]["y_train_train"]
 
-            # Create new pipeline with the params of the best estimator (need to re-train the imputer on less features)
+            # Create new pipeline with the params of the best estimator (imputer and scaler restricted to less features)
             top_n_features = get_top_n_features(feature_subsets, diag, nb_features)
-            new_estimator = fit_estimator_on_subset_of_features(best_estimators, diag, X_train[top_n_features], y_train)
+            new_estimator = fit_estimator_on_subset_of_features(best_estimators, diag, fold_transform_cache, top_n_features)
             estimators_on_feature_subsets[nb_features] = new_estimator
             
     return estimators_on_feature_subsets
@@ -0,0 +1,72 @@
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterSampler, cross_val_score
+
+# Search for random forest scoring candidates with out-of-bag (OOB) predictions: one fit per candidate instead of one per fold.
+#   SD of the OOB ROC AUC is estimated by bootstrapping the OOB predictions. Only the best candidate is scored with CV,
+#   so its score is comparable to the scores of other models.
+
+N_BOOTSTRAP_SAMPLES = 200
+
+def get_weighted_aucs(y, pred_prob, weights):
+    # ROC AUC for each row of weights (number of times each example is in a bootstrap sample), all at once:
+    #   for each group of tied predictions, positives count negatives below them, and half of tied negatives
+    order = np.argsort(pred_prob, kind="mergesort")
+    sorted_pred_prob = pred_prob[order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_pred_prob[1:] != sorted_pred_prob[:-1]])
+
+    sorted_weights = weights[:, order]
+    pos_weights = np.add.reduceat(sorted_weights * (y[order] == 1), group_starts, axis=1)
+    neg_weights = np.add.reduceat(sorted_weights * (y[order] != 1), group_starts, axis=1)
+    neg_below = np.cumsum(neg_weights, axis=1) - neg_weights
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (pos_weights * (neg_below + 0.5 * neg_weights)).sum(axis=1) / (pos_weights.sum(axis=1) * neg_weights.sum(axis=1))
+
+def get_oob_auc_and_sd(y, oob_decision_function, rng):
+    # Rows that were in the bootstrap sample of every tree have no OOB prediction: sklearn leaves their probabilities at 0
+    #   for all classes (OOB probabilities of other rows sum to 1)
+    has_oob_pred = oob_decision_function.sum(axis=1) > 0
+    y, oob_pred_prob = y[has_oob_pred], oob_decision_function[has_oob_pred, 1]
+
+    auc = roc_auc_score(y, oob_pred_prob)
+    bootstrap_weights = rng.multinomial(len(y), np.full(len(y), 1 / len(y)), size=N_BOOTSTRAP_SAMPLES)
+    bootstrap_aucs = get_weighted_aucs(y, oob_pred_prob, bootstrap_weights)
+    return auc, np.nanstd(bootstrap_aucs)
+
+def get_best_rf_by_oob(base_model, grid, cv, n_iter, X, y, n_jobs=-1, random_state=None):
+    candidates = list(ParameterSampler(grid, n_iter=n_iter, random_state=random_state))
+    rng = np.random.RandomState(random_state)
+
+    # Imputer and scaler are fitted once on all rows (there are no folds)
+    preprocessing = clone(base_model[:-1])
+    X_preprocessed = preprocessing.fit_transform(X, y)
+    y_values = np.asarray(y)
+
+    oob_scores = np.full(len(candidates), np.nan)
+    oob_sds = np.full(len(candidates), np.nan)
+    for i, params in enumerate(candidates):
+        rf = clone(base_model[-1]).set_params(**{param.replace("randomforestclassifier__", ""): value for param, value in params.items()},
+                                              bootstrap=True, oob_score=True, n_jobs=n_jobs)
+        try:
+            rf.fit(X_preprocessed, y_values)
+        except ValueError as e:
+            # Invalid parameter combinations get no score, as with error_score=np.nan in sklearn searches
+            print("Candidate", params, "failed:", e)
+            continue
+        oob_scores[i], oob_sds[i] = get_oob_auc_and_sd(y_values, rf.oob_decision_function_, rng)
+
+    if np.isnan(oob_scores).all():
+        raise ValueError(f"All {len(candidates)} candidates failed")
+    best_index = np.nanargmax(oob_scores)
+    best_estimator = clone(base_model).set_params(**candidates[best_index])
+    print(f"Best OOB ROC AUC: {oob_scores[best_index]:.3f} (bootstrap SD {oob_sds[best_index]:.3f}), params: {candidates[best_index]}")
+
+    # Confirm the best candidate with CV
+    cv_scores = cross_val_score(best_estimator, X, y, cv=cv, scoring="roc_auc", n_jobs=n_jobs)
+    print(f"CV ROC AUC of best OOB candidate: {cv_scores.mean():.3f} (SD {cv_scores.std():.3f})")
+
+    best_estimator.fit(X, y)
+
+    return best_estimator, cv_scores.mean(), cv_scores.std()
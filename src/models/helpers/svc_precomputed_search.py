@@ -0,0 +1,132 @@
+import numpy as np
+from sklearn.base import clone
+from sklearn.svm import SVC
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterSampler, cross_val_predict
+from joblib import Parallel, delayed
+
+# To import from parent directory
+import os, sys, inspect
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+import models
+
+# Search for SVC with precomputed kernels: Gram and squared distance matrices are computed once per fold,
+#   and each candidate only applies its kernel function to them (e.g. exp(-gamma * D) for rbf).
+#   Probabilities of the best candidate are calibrated (Platt scaling) on its out-of-fold decision values
+#   from the search, instead of the internal CV of probability=True.
+
+class PlattCalibratedSVC(SVC):
+    # SVC with predict_proba from a sigmoid fitted on decision values
+    base_model_name = "svc"
+
+    def fit(self, X, y, sample_weight=None):
+        # When fitted outside of the search (e.g. on feature subsets), calibrate on 3-fold CV decision values
+        self.fit_without_calibration(X, y, sample_weight)
+        decision_values = cross_val_predict(SVC(**self.get_params()), X, y, cv=3, method="decision_function")
+        return self.fit_calibration(decision_values, y)
+
+    def fit_without_calibration(self, X, y, sample_weight=None):
+        return super().fit(X, y, sample_weight)
+
+    def fit_calibration(self, decision_values, y):
+        calibration = LogisticRegression(C=1e6).fit(np.asarray(decision_values).reshape(-1, 1), np.asarray(y) == self.classes_[1])
+        self.platt_a_ = calibration.coef_[0, 0]
+        self.platt_b_ = calibration.intercept_[0]
+        return self
+
+    def predict_proba(self, X):
+        positive_prob = 1 / (1 + np.exp(-(self.platt_a_ * self.decision_function(X) + self.platt_b_)))
+        return np.column_stack([1 - positive_prob, positive_prob])
+
+def get_fold_matrices(base_model, X, y, train_index, val_index):
+    # Gram (G) and squared distance (D) matrices of the preprocessed fold data, train x train and val x train
+    preprocessing = clone(base_model[:-1])
+    X_train = preprocessing.fit_transform(X.iloc[train_index], y.iloc[train_index])
+    X_val = preprocessing.transform(X.iloc[val_index])
+
+    G_train = X_train @ X_train.T
+    G_val = X_val @ X_train.T
+    train_sq_norms = np.diag(G_train)
+    val_sq_norms = (X_val ** 2).sum(axis=1)
+    D_train = np.maximum(train_sq_norms[:, None] + train_sq_norms[None, :] - 2 * G_train, 0)
+    D_val = np.maximum(val_sq_norms[:, None] + train_sq_norms[None, :] - 2 * G_val, 0)
+
+    return {"G_train": G_train, "G_val": G_val, "D_train": D_train, "D_val": D_val, "X_var": X_train.var(), "n_features": X_train.shape[1],
+            "y_train": y.iloc[train_index].to_numpy(), "y_val": y.iloc[val_index].to_numpy()}
+
+def get_kernel(svc, G, D, X_var, n_features):
+    # Same kernels as SVC (sklearn.metrics.pairwise)
+    gamma = svc.gamma
+    if gamma == "scale":
+        gamma = 1 / (n_features * X_var) if X_var != 0 else 1
+    elif gamma == "auto":
+        gamma = 1 / n_features
+
+    if svc.kernel == "linear":
+        return G
+    if svc.kernel == "rbf":
+        return np.exp(-gamma * D)
+    if svc.kernel == "poly":
+        return (gamma * G + svc.coef0) ** svc.degree
+    if svc.kernel == "sigmoid":
+        return np.tanh(gamma * G + svc.coef0)
+    raise ValueError(f"Kernel {svc.kernel} not supported with precomputed kernels")
+
+def get_svc_params(params):
+    return {param.replace("svc__", ""): value for param, value in params.items()}
+
+def get_candidate_decision_values(base_model, params, folds):
+    svc = clone(base_model[-1]).set_params(**get_svc_params(params))
+    decision_values = []
+    for fold in folds:
+        precomputed_svc = clone(svc).set_params(kernel="precomputed", probability=False)
+        try:
+            precomputed_svc.fit(get_kernel(svc, fold["G_train"], fold["D_train"], fold["X_var"], fold["n_features"]), fold["y_train"])
+            decision_values.append(precomputed_svc.decision_function(get_kernel(svc, fold["G_val"], fold["D_val"], fold["X_var"], fold["n_features"])))
+        except ValueError as e:
+            # Invalid parameter combinations get no score, as with error_score=np.nan in sklearn searches
+            print("Candidate", params, "failed:", e)
+            decision_values.append(np.full(len(fold["y_val"]), np.nan))
+    return decision_values
+
+def get_fold_score(y, decision_values):
+    if np.isnan(decision_values).any():
+        return np.nan
+    return roc_auc_score(y, decision_values)
+
+def get_best_svc_on_precomputed_kernels(base_model, grid, cv, n_iter, X, y, n_jobs=-1, random_state=None, score_to_beat=None):
+    candidates = list(ParameterSampler(grid, n_iter=n_iter, random_state=random_state))
+    folds = [get_fold_matrices(base_model, X, y, train_index, val_index) for train_index, val_index in cv.split(X, y)]
+
+    # Candidates are scored in batches, stopping early if they can't beat score_to_beat (models.run_batched_random_search)
+    scores = []
+    decision_values = []
+    for batch_start in range(0, len(candidates), models.BATCH_SIZE):
+        batch = candidates[batch_start:batch_start + models.BATCH_SIZE]
+        batch_decision_values = Parallel(n_jobs=n_jobs)(delayed(get_candidate_decision_values)(base_model, params, folds) for params in batch)
+        for candidate_decision_values in batch_decision_values:
+            scores.append([get_fold_score(fold["y_val"], fold_decision_values) for fold, fold_decision_values in zip(folds, candidate_decision_values)])
+            decision_values.append(candidate_decision_values)
+
+        mean_scores, sd_scores = np.mean(scores, axis=1), np.std(scores, axis=1)
+        if np.isnan(mean_scores).all():
+            continue
+        best_index = np.nanargmax(mean_scores)
+        if len(scores) < len(candidates) and models.cant_beat_score(mean_scores[best_index], sd_scores[best_index], score_to_beat):
+            print(f"Stopping search after {len(scores)} of {len(candidates)} candidates: best score {mean_scores[best_index]:.3f} (SD {sd_scores[best_index]:.3f}), score to beat {score_to_beat:.3f}")
+            break
+
+    if np.isnan(mean_scores).all():
+        raise ValueError(f"All {len(candidates)} candidates failed")
+
+    # Fit best candidate on all data, calibrate probabilities on its out-of-fold decision values
+    best_svc = PlattCalibratedSVC(**clone(base_model[-1]).set_params(**get_svc_params(candidates[best_index])).get_params())
+    best_estimator = clone(base_model)
+    best_estimator.steps[-1] = (best_estimator.steps[-1][0], best_svc)
+    best_svc.fit_without_calibration(best_estimator[:-1].fit_transform(X, y), y)
+    best_svc.fit_calibration(np.concatenate(decision_values[best_index]), np.concatenate([fold["y_val"] for fold in folds]))
+
+    return best_estimator, mean_scores[best_index], sd_scores[best_index]
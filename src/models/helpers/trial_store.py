@@ -0,0 +1,68 @@
+import sqlite3, json, io
+import numpy as np
+from joblib import hash as joblib_hash, dump, load
+
+# SQLite store of hyperparameter search trials, to resume interrupted searches and re-select models without refitting.
+#   trials: CV score of each (dataset fingerprint, diagnosis, model type, params, fold)
+#   best_estimators: best estimator of each finished search, with its CV score and SD, and the score to beat it was searched with
+#     (not part of the key, searches that stopped early are re-checked against the current score to beat, see train_models.py)
+
+def get_dataset_fingerprint(X, y, cv):
+    # Scores are only comparable on the same data and folds
+    return joblib_hash((X, y, cv.get_n_splits()))
+
+def get_params_key(params):
+    # numpy values to python values, so the same params always give the same key
+    return json.dumps({param: (value.item() if hasattr(value, "item") else value) for param, value in sorted(params.items())}, default=str)
+
+class TrialStore:
+    # Store for one search (dataset fingerprint, diagnosis, model type). Only keeps the path and keys,
+    #   so it can be passed to worker processes, each call opens its own connection.
+    def __init__(self, path, fingerprint, diag, model_type):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.diag = diag
+        self.model_type = model_type
+        with self.connect() as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS trials (fingerprint TEXT, diag TEXT, model_type TEXT, params TEXT, fold INTEGER, score REAL,
+                                  PRIMARY KEY (fingerprint, diag, model_type, params, fold))""")
+            connection.execute("""CREATE TABLE IF NOT EXISTS best_estimators (fingerprint TEXT, diag TEXT, model_type TEXT, search_config TEXT, estimator BLOB, score REAL, sd REAL,
+                                  score_to_beat REAL, PRIMARY KEY (fingerprint, diag, model_type, search_config))""")
+            # Stores created before score_to_beat was recorded
+            if "score_to_beat" not in [column[1] for column in connection.execute("PRAGMA table_info(best_estimators)")]:
+                connection.execute("ALTER TABLE best_estimators ADD COLUMN score_to_beat REAL")
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+
+    def get_fold_scores(self):
+        with self.connect() as connection:
+            rows = connection.execute("SELECT params, fold, score FROM trials WHERE fingerprint = ? AND diag = ? AND model_type = ?",
+                                      (self.fingerprint, self.diag, self.model_type)).fetchall()
+        return {(params_key, fold): (np.nan if score is None else score) for params_key, fold, score in rows}
+
+    def add_fold_scores(self, params_fold_scores):
+        rows = [(self.fingerprint, self.diag, self.model_type, get_params_key(params), fold, float(score)) for params, fold, score in params_fold_scores]
+        with self.connect() as connection:
+            connection.executemany("INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def get_best_estimator(self, search_config):
+        with self.connect() as connection:
+            row = connection.execute("SELECT estimator, score, sd, score_to_beat FROM best_estimators WHERE fingerprint = ? AND diag = ? AND model_type = ? AND search_config = ?",
+                                     (self.fingerprint, self.diag, self.model_type, get_params_key(search_config))).fetchone()
+        if row is None:
+            return None
+        estimator, score, sd, score_to_beat = row
+        return load(io.BytesIO(estimator)), score, sd, score_to_beat
+
+    def save_best_estimator(self, search_config, estimator, score, sd, score_to_beat=None):
+        estimator_bytes = io.BytesIO()
+        dump(estimator, estimator_bytes)
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO best_estimators VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (self.fingerprint, self.diag, self.model_type, get_params_key(search_config), estimator_bytes.getvalue(), float(score), float(sd),
+                                None if score_to_beat is None else float(score_to_beat)))
+
+def get_mean_and_sd_scores(candidates, fold_scores, n_folds):
+    scores = np.array([[fold_scores[(get_params_key(params), fold)] for fold in range(n_folds)] for params in candidates])
+    return scores.mean(axis=1), scores.std(axis=1)
@@ -12,7 +12,7 @@ import pandas as pd
 currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
-import models, util
+import models, util, data
 
 DEBUG_MODE = True
 
@@ -69,6 +69,7 @@ def set_up_load_directories():
 
 def get_feature_subsets(best_estimators, datasets, number_of_features_to_check, dirs):
     feature_subsets = {}
+    stopping_info = {}
     for i, diag in enumerate(best_estimators):
         base_model_type = util.get_base_model_name_from_pipeline(best_estimators[diag])
         base_model = util.get_estimator_from_pipeline(best_estimators[diag])
@@ -77,11 +78,14 @@ def get_feature_subsets(best_estimators, datasets, number_of_features_to_check,
             continue
         # If base model exposes feature importances, use RFE to get first 50 feature, then use SFS to get the rest.
         if not (base_model_type == "svc" and base_model.kernel != "linear"):
-            feature_subsets[diag] = models.get_feature_subsets_from_rfe_then_sfs(diag, best_estimators, datasets, number_of_features_to_check)
+            feature_subsets[diag], stopping_info[diag] = models.get_feature_subsets_from_rfe_then_sfs(diag, best_estimators, datasets, number_of_features_to_check)
         # If base model doesn't expose feature importances, use SFS to get feature subsets directly (will take very long)
         else:
-            feature_subsets[diag] = models.get_feature_subsets_from_sfs(diag, best_estimators, datasets, number_of_features_to_check)
+            feature_subsets[diag], stopping_info[diag] = models.get_feature_subsets_from_sfs(diag, best_estimators, number_of_features_to_check, 
+                                                                                              datasets[diag]["X_train_train"], datasets[diag]["y_train_train"])
         dump(feature_subsets, dirs["output_reports_dir"]+'feature-subsets.joblib')
+        # Number of features where selection stopped (early if the CV AUC saturated) for each diagnosis
+        util.write_dict_to_file(stopping_info, dirs["output_reports_dir"], "feature-subsets-stopping.txt")
     return feature_subsets
     
 def main(number_of_features_to_check = 126, importances_from_file = 0):
@@ -91,7 +95,7 @@ def main(number_of_features_to_check = 126, importances_from_file = 0):
     dirs = set_up_directories()
 
     best_estimators = load(dirs["models_dir"]+'best-estimators.joblib')
-    datasets = load(dirs["input_data_dir"]+'datasets.joblib')
+    datasets = data.load_datasets(dirs["input_data_dir"])
 
     if importances_from_file == 1:
         load_dirs = set_up_load_directories()
@@ -16,18 +16,27 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import make_pipeline
 
 from sklearn.model_selection import RandomizedSearchCV
+from sklearn.experimental import enable_halving_search_cv
+from sklearn.model_selection import HalvingRandomSearchCV
 
-import sys, inspect
+import sys, inspect, time, tempfile, shutil
 
-from joblib import load, dump
+from joblib import load, dump, Parallel, delayed
 
 # To import from parent directory
 currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
-import util, models
+import util, models, data
 
 DEBUG_MODE = True
+SEARCH_STRATEGY = "random" # "random": all candidates on all data, "halving": successive halving (only best candidates get more data / trees)
+LR_SEARCH_STRATEGY = "path" # "path": warm-started search along C paths (models.get_best_lr_on_c_paths), "default": same search as other models
+N_CORES = os.cpu_count() # Core budget, split between searches run at the same time and CV inside each search
+RF_SEARCH_STRATEGY = "cv" # "cv": same search as other models, "oob": candidates scored with out-of-bag predictions, best one confirmed with CV (models.get_best_rf_by_oob)
+SVC_SEARCH_STRATEGY = "default" # "default": same search as other models, "precomputed": kernels from per-fold distance matrices, fast probability calibration (models.get_best_svc_on_precomputed_kernels)
+ADAPTIVE_BUDGET = True # Search LR first, stop searches of other models when they can't beat LR by more than performance_margin (only with "random" SEARCH_STRATEGY)
+RANDOM_STATE = 0 # Seed for parameter grids and sampled candidates, so a rerun evaluates the same candidates (and can reuse stored trials)
 
 def build_output_dir_name(params_from_create_datasets):
     # Part with the datetime
@@ -62,7 +71,10 @@ def set_up_directories():
     reports_dir = data_dir + "reports/" + "train_models/" + current_output_dir_name + "/"
     util.create_dir_if_not_exists(reports_dir) 
 
-    return {"input_data_dir": input_data_dir, "models_dir": models_dir, "reports_dir": reports_dir}
+    # Trial store is shared by all runs (trials are keyed by dataset fingerprint)
+    trial_store_path = data_dir + "models/" + "train_models/" + "trial-store.sqlite"
+
+    return {"input_data_dir": input_data_dir, "models_dir": models_dir, "reports_dir": reports_dir, "trial_store_path": trial_store_path}
 
 def set_up_load_directories():
     # When loading existing models, can't take the newest directory, we just created it, it will be empty. 
@@ -76,7 +88,7 @@ def set_up_load_directories():
     
     return {"load_data_dir": load_data_dir, "load_models_dir": load_models_dir, "load_reports_dir": load_reports_dir}
     
-def get_base_models_and_param_grids():
+def get_base_models_and_param_grids(preprocessing_cache_dir=None):
     
     # Define base models
     rf = RandomForestClassifier(n_estimators=200 if DEBUG_MODE else 400)
@@ -89,17 +101,19 @@ def get_base_models_and_param_grids():
     # Standardize data
     scaler = StandardScaler()
 
-    # Make pipelines
-    rf_pipe = make_pipeline(imputer, scaler, rf)
-    svc_pipe = make_pipeline(imputer, scaler, svc)
-    lr_pipe = make_pipeline(imputer, scaler, lr)
+    # Make pipelines. With a cache dir, fitted imputer and scaler are cached on disk per fold data, 
+    #   so they are fitted once per fold and reused by all candidates and model types
+    rf_pipe = make_pipeline(imputer, scaler, rf, memory=preprocessing_cache_dir)
+    svc_pipe = make_pipeline(imputer, scaler, svc, memory=preprocessing_cache_dir)
+    lr_pipe = make_pipeline(imputer, scaler, lr, memory=preprocessing_cache_dir)
     
     # Define parameter grids to search for each pipe
-    from scipy.stats import loguniform, uniform
+    from scipy.stats import loguniform, uniform, randint
+    rng = np.random.RandomState(RANDOM_STATE)
     rf_param_grid = {
-        'randomforestclassifier__max_depth' : np.random.randint(5, 150, 30),
-        'randomforestclassifier__min_samples_split': np.random.randint(2, 50, 30),
-        'randomforestclassifier__min_samples_leaf': np.random.randint(1, 20, 30),
+        'randomforestclassifier__max_depth' : rng.randint(5, 150, 30),
+        'randomforestclassifier__min_samples_split': rng.randint(2, 50, 30),
+        'randomforestclassifier__min_samples_leaf': rng.randint(1, 20, 30),
         'randomforestclassifier__max_features': ['auto', 'sqrt', 'log2', 0.25, 0.5, 0.75, 1.0],
         'randomforestclassifier__criterion': ['gini', 'entropy'],
         'randomforestclassifier__class_weight':["balanced", "balanced_subsample", None],
@@ -108,7 +122,7 @@ def get_base_models_and_param_grids():
     svc_param_grid = {
         'svc__C': loguniform(1e-1, 1e3),
         'svc__gamma': loguniform(1e-04, 1e+01),
-        'svc__degree': uniform(2, 5),
+        'svc__degree': randint(2, 7), # SVC only accepts integer degrees
         'svc__kernel': ['linear', 'poly', 'rbf', 'sigmoid'],
         "svc__class_weight": ['balanced', None]
     }
@@ -130,32 +144,103 @@ def get_base_models_and_param_grids():
     
     return base_models_and_param_grids
 
-def get_best_estimator(base_model, grid, X_train, y_train):
-    cv = StratifiedKFold(n_splits=3 if DEBUG_MODE else 8)
-    rs = RandomizedSearchCV(estimator=base_model, param_distributions=grid, cv=cv, scoring="roc_auc", n_iter=50 if DEBUG_MODE else 200, n_jobs = -1, verbose=1)
-    
+def get_search(base_model, grid, cv, n_iter, n_jobs, n_samples):
+    if SEARCH_STRATEGY == "halving":
+        # Resource is the number of trees for random forest, number of rows for other models. 
+        #   First iteration gets 1/9 of the resource (1/9 of rows would be too few if all candidates were halved to 1)
+        if "randomforestclassifier" in base_model.named_steps.keys():
+            max_resources = base_model.get_params()["randomforestclassifier__n_estimators"]
+            resource_params = {"resource": "randomforestclassifier__n_estimators", "max_resources": max_resources, "min_resources": max(max_resources // 9, 1)}
+        else:
+            resource_params = {"resource": "n_samples", "min_resources": min(max(n_samples // 9, cv.get_n_splits() * 10), n_samples)}
+        return HalvingRandomSearchCV(estimator=base_model, param_distributions=grid, cv=cv, scoring="roc_auc", n_candidates=n_iter, factor=3, n_jobs = n_jobs, verbose=1, random_state=RANDOM_STATE, **resource_params)
+    else:
+        return RandomizedSearchCV(estimator=base_model, param_distributions=grid, cv=cv, scoring="roc_auc", n_iter=n_iter, n_jobs = n_jobs, verbose=1, random_state=RANDOM_STATE)
+
+def get_cv():
+    return StratifiedKFold(n_splits=3 if DEBUG_MODE else 8)
+
+def get_n_iter():
+    return 50 if DEBUG_MODE else 200
+
+def get_search_config(model_type):
+    # Stored best estimators are only reused if they were found with the same search. The score to beat (from performance_margin)
+    #   is not part of it, it only decides when the search stops (see can_reuse_stored_search)
+    search_config = {"search_strategy": SEARCH_STRATEGY, "n_iter": get_n_iter(), "n_splits": get_cv().get_n_splits(), "random_state": RANDOM_STATE}
+    if model_type == "logisticregression":
+        search_config["lr_search_strategy"] = LR_SEARCH_STRATEGY
+    if model_type == "randomforestclassifier":
+        search_config["rf_search_strategy"] = RF_SEARCH_STRATEGY
+    if model_type == "svc":
+        search_config["svc_search_strategy"] = SVC_SEARCH_STRATEGY
+    return search_config
+
+def can_reuse_stored_search(stored_score, stored_sd, stored_score_to_beat, score_to_beat):
+    # A stored search could only have stopped early if its best score couldn't beat the score to beat it was run with.
+    #   It is reused if it can't have stopped early (it went through all candidates), or if the stopping rule still holds 
+    #   with the current score to beat. Otherwise it is run again (stored trials are not refitted, models.run_batched_random_search)
+    could_have_stopped_early = models.cant_beat_score(stored_score, stored_sd, stored_score_to_beat)
+    return not could_have_stopped_early or models.cant_beat_score(stored_score, stored_sd, score_to_beat)
+
+def get_best_estimator(base_model, grid, X_train, y_train, n_jobs=-1, trial_store=None, score_to_beat=None):
+    cv = get_cv()
+    n_iter = get_n_iter()
+
     print("Fitting", base_model, "...")
-    rs.fit(X_train, y_train) 
-    
-    best_estimator = rs.best_estimator_
-    best_score = rs.best_score_
-    sd_of_score_of_best_estimator = rs.cv_results_['std_test_score'][rs.best_index_]
+    start_time = time.time()
+    if "logisticregression" in base_model.named_steps.keys() and LR_SEARCH_STRATEGY == "path":
+        best_estimator, best_score, sd_of_score_of_best_estimator = models.get_best_lr_on_c_paths(base_model, grid, cv, n_iter, X_train, y_train, n_jobs, trial_store, RANDOM_STATE)
+        print(f"Search (path) done in {time.time() - start_time:.1f} s")
+    elif "randomforestclassifier" in base_model.named_steps.keys() and RF_SEARCH_STRATEGY == "oob":
+        # OOB scores are not stored in the trial store (only the best estimator is)
+        best_estimator, best_score, sd_of_score_of_best_estimator = models.get_best_rf_by_oob(base_model, grid, cv, n_iter, X_train, y_train, n_jobs, RANDOM_STATE)
+        print(f"Search (oob) done in {time.time() - start_time:.1f} s")
+    elif "svc" in base_model.named_steps.keys() and SVC_SEARCH_STRATEGY == "precomputed":
+        # Trials are not stored in the trial store (only the best estimator is)
+        best_estimator, best_score, sd_of_score_of_best_estimator = models.get_best_svc_on_precomputed_kernels(base_model, grid, cv, n_iter, X_train, y_train, n_jobs, RANDOM_STATE, score_to_beat)
+        print(f"Search (precomputed) done in {time.time() - start_time:.1f} s")
+    elif SEARCH_STRATEGY == "random" and (trial_store is not None or score_to_beat is not None):
+        best_estimator, best_score, sd_of_score_of_best_estimator = models.run_batched_random_search(base_model, grid, cv, n_iter, X_train, y_train, n_jobs, trial_store, RANDOM_STATE, score_to_beat)
+        print(f"Search ({SEARCH_STRATEGY}, in batches) done in {time.time() - start_time:.1f} s")
+    else:
+        # Halving search trials are not stored (only the best estimator is), and it isn't stopped early
+        rs = get_search(base_model, grid, cv, n_iter, n_jobs, X_train.shape[0])
+        rs.fit(X_train, y_train) 
+        print(f"Search ({SEARCH_STRATEGY}) done in {time.time() - start_time:.1f} s")
+        
+        best_estimator = rs.best_estimator_
+        best_score = rs.best_score_
+        sd_of_score_of_best_estimator = rs.cv_results_['std_test_score'][rs.best_index_]
+
+    # Saved estimators shouldn't refer to the preprocessing cache (it's removed after training)
+    best_estimator.set_params(memory=None)
 
     # If chosen model is SVM add a predict_proba parameter (not needed for grid search, and slows it down significantly)
-    if 'svc' in best_estimator.named_steps.keys():
+    #   (SVC from precomputed kernel search already has calibrated probabilities)
+    if 'svc' in best_estimator.named_steps.keys() and not isinstance(best_estimator.named_steps['svc'], models.PlattCalibratedSVC):
         best_estimator.set_params(svc__probability=True)
 
     return (best_estimator, best_score, sd_of_score_of_best_estimator)
 
-def find_best_estimator_for_diag_and_its_score(X_train, y_train, performance_margin):
-    base_models_and_param_grids = get_base_models_and_param_grids()
-    best_estimators_and_scores = []
-    
-    for (base_model, grid) in base_models_and_param_grids:
-        best_estimator_for_model, best_score_for_model, sd_of_score_of_best_estimator_for_model = get_best_estimator(base_model, grid, X_train, y_train)
-        model_type = list(base_model.named_steps.keys())[-1]
-        best_estimators_and_scores.append([model_type, best_estimator_for_model, best_score_for_model, sd_of_score_of_best_estimator_for_model])
-    
+def get_best_estimator_for_model_type(base_model, grid, X_train, y_train, n_jobs=-1, trial_store_path=None, diag=None, score_to_beat=None):
+    model_type = list(base_model.named_steps.keys())[-1]
+    if trial_store_path is None:
+        best_estimator_for_model, best_score_for_model, sd_of_score_of_best_estimator_for_model = get_best_estimator(base_model, grid, X_train, y_train, n_jobs, None, score_to_beat)
+        return [model_type, best_estimator_for_model, best_score_for_model, sd_of_score_of_best_estimator_for_model]
+
+    # Reuse the best estimator of a finished search on the same data, otherwise search (skipping stored trials) and store the best estimator
+    trial_store = models.TrialStore(trial_store_path, models.get_dataset_fingerprint(X_train, y_train, get_cv()), diag, model_type)
+    search_config = get_search_config(model_type)
+    stored_best_estimator = trial_store.get_best_estimator(search_config)
+    if stored_best_estimator is not None and can_reuse_stored_search(*stored_best_estimator[1:], score_to_beat):
+        print("Best", model_type, "for", diag, "found in trial store")
+        best_estimator_for_model, best_score_for_model, sd_of_score_of_best_estimator_for_model = stored_best_estimator[:3]
+    else:
+        best_estimator_for_model, best_score_for_model, sd_of_score_of_best_estimator_for_model = get_best_estimator(base_model, grid, X_train, y_train, n_jobs, trial_store, score_to_beat)
+        trial_store.save_best_estimator(search_config, best_estimator_for_model, best_score_for_model, sd_of_score_of_best_estimator_for_model, score_to_beat)
+    return [model_type, best_estimator_for_model, best_score_for_model, sd_of_score_of_best_estimator_for_model]
+
+def select_best_estimator(best_estimators_and_scores, performance_margin):
     best_estimators_and_scores = pd.DataFrame(best_estimators_and_scores, columns = ["Model type", "Best estimator", "Best score", "SD of best score"])
     print(best_estimators_and_scores)
     best_estimator = best_estimators_and_scores.sort_values("Best score", ascending=False)["Best estimator"].iloc[0]
@@ -177,25 +262,67 @@ def find_best_estimator_for_diag_and_its_score(X_train, y_train, performance_mar
     
     return best_estimator, best_score, sd_of_score_of_best_estimator
 
+def get_n_jobs_per_search(n_searches):
+    # Run as many searches at the same time as there are cores (at most), and give the remaining cores to CV inside each search
+    n_outer_jobs = max(1, min(n_searches, N_CORES))
+    n_inner_jobs = max(1, N_CORES // n_outer_jobs)
+    return n_outer_jobs, n_inner_jobs
+
 # Find best estimator
-def find_best_estimators_and_scores(datasets, diag_cols, performance_margin):
+def find_best_estimators_and_scores(datasets, diag_cols, performance_margin, trial_store_path=None):
     best_estimators = {}
     scores_of_best_estimators = {}
     sds_of_scores_of_best_estimators = {}
+
+    # One search per (diagnosis, model type), run in parallel
+    preprocessing_cache_dir = tempfile.mkdtemp(prefix="train_models_preprocessing_cache_")
+    searches = []
+    for diag in diag_cols:
+        for (base_model, grid) in get_base_models_and_param_grids(preprocessing_cache_dir):
+            searches.append((diag, base_model, grid))
+
+    # With adaptive budget, LR searches run first. Other searches stop early when they can't beat 
+    #   the LR score by more than performance_margin (LR would be chosen anyway)
+    if ADAPTIVE_BUDGET:
+        search_phases = [[search for search in searches if "logisticregression" in search[1].named_steps.keys()],
+                         [search for search in searches if "logisticregression" not in search[1].named_steps.keys()]]
+    else:
+        search_phases = [searches]
+    
+    search_results = {}
+    try:
+        for search_phase in search_phases:
+            if len(search_phase) == 0:
+                continue
+            n_outer_jobs, n_inner_jobs = get_n_jobs_per_search(len(search_phase))
+            print(f"Running {len(search_phase)} searches, {n_outer_jobs} at a time with {n_inner_jobs} jobs each")
+
+            lr_scores = {diag: search_result[2] for (diag, model_type), search_result in search_results.items() if model_type == "logisticregression"}
+            search_phase_results = Parallel(n_jobs=n_outer_jobs)(
+                delayed(get_best_estimator_for_model_type)(base_model, grid, datasets[diag]["X_train_train"], datasets[diag]["y_train_train"], n_inner_jobs, trial_store_path, diag, 
+                                                           lr_scores[diag] + performance_margin if diag in lr_scores else None) 
+                for (diag, base_model, grid) in search_phase)
+            for (diag, _, _), search_result in zip(search_phase, search_phase_results):
+                search_results[(diag, search_result[0])] = search_result
+    finally:
+        shutil.rmtree(preprocessing_cache_dir, ignore_errors=True)
+    
+    # Results in the same order of model types as without adaptive budget
+    best_estimators_and_scores_per_diag = {diag: [] for diag in diag_cols}
+    for (diag, base_model, _) in searches:
+        best_estimators_and_scores_per_diag[diag].append(search_results[(diag, list(base_model.named_steps.keys())[-1])])
+    
     for i, diag in enumerate(diag_cols):
         print(diag, f'{i+1}/{len(diag_cols)}')
 
-        X_train = datasets[diag]["X_train_train"]
-        y_train = datasets[diag]["y_train_train"]
-        
-        best_estimator_for_diag, best_score_for_diag, sd_of_score_of_best_estimator_for_diag = find_best_estimator_for_diag_and_its_score(X_train, y_train, performance_margin)
+        best_estimator_for_diag, best_score_for_diag, sd_of_score_of_best_estimator_for_diag = select_best_estimator(best_estimators_and_scores_per_diag[diag], performance_margin)
         best_estimators[diag] = best_estimator_for_diag
         sds_of_scores_of_best_estimators[diag] = sd_of_score_of_best_estimator_for_diag
         scores_of_best_estimators[diag] = best_score_for_diag
 
         if DEBUG_MODE and util.get_base_model_name_from_pipeline(best_estimators[diag]) == "logisticregression":
             # In debug mode print top features from LR
-            models.print_top_features_from_lr(best_estimators[diag], X_train, 10)
+            models.print_top_features_from_lr(best_estimators[diag], datasets[diag]["X_train_train"], 10)
             
     return best_estimators, scores_of_best_estimators, sds_of_scores_of_best_estimators
 
@@ -231,7 +358,7 @@ def main(performance_margin = 0.02, models_from_file = 1):
     dirs = set_up_directories()
     load_dirs = set_up_load_directories()
 
-    datasets = load(load_dirs["load_data_dir"]+'datasets.joblib')
+    datasets = data.load_datasets(load_dirs["load_data_dir"])
     diag_cols = list(datasets.keys())
     print("Train set shape: ", datasets[diag_cols[0]]["X_train_train"].shape)
 
@@ -248,7 +375,7 @@ def main(performance_margin = 0.02, models_from_file = 1):
         dump_estimators_and_performances(dirs, best_estimators, scores_of_best_estimators, sds_of_scores_of_best_estimators)
     else: 
         # Find best models for each diagnosis
-        best_estimators, scores_of_best_estimators, sds_of_scores_of_best_estimators = find_best_estimators_and_scores(datasets, diag_cols, performance_margin)
+        best_estimators, scores_of_best_estimators, sds_of_scores_of_best_estimators = find_best_estimators_and_scores(datasets, diag_cols, performance_margin, dirs["trial_store_path"])
         
         # Save best estimators and thresholds 
         dump_estimators_and_performances(dirs, best_estimators, scores_of_best_estimators, sds_of_scores_of_best_estimators)
@@ -1,4 +1,4 @@
-import os, shutil, json, numpy
+import os, shutil, json, numpy, hashlib
 
 # File Utilities
 def clean_dir(folder):
@@ -37,6 +37,14 @@ def write_two_lvl_dict_to_file(dict, path):
     for key in dict.keys():
         write_dict_to_file(dict[key], path, key+".txt")
 
+def get_file_hash(path):
+    # Read in blocks to not load the whole file in memory
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(2**20), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
 def remove_chars_forbidden_in_file_names(string):
     forbidden_chars = ['\\', '/', ':', '*', '?', '"', '<', '>', '|']
     for char in forbidden_chars:
@@ -55,7 +63,8 @@ def build_param_string_for_dir_name(params):
 
 # Model Utilities
 def get_base_model_name_from_estimator(estimator):
-    return estimator.__class__.__name__.lower()
+    # Subclasses of base models (e.g. PlattCalibratedSVC) have the name of their base model
+    return getattr(estimator, "base_model_name", estimator.__class__.__name__.lower())
 
 def get_estimator_from_pipeline(pipeline):
     return pipeline.steps[-1][1]
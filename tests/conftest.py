@@ -0,0 +1,5 @@
+import os, sys
+
+# Same imports as the scripts in src/: packages from src/, helpers from src/models/ and src/data/
+srcdir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path[:0] = [srcdir, os.path.join(srcdir, "models"), os.path.join(srcdir, "data")]
@@ -0,0 +1,53 @@
+import mmap
+import numpy as np
+import pandas as pd
+
+from data.helpers import dataset_store
+from data.helpers.shared_base_datasets import DATASET_KEYS
+
+DIAG = "New Diag.Test"
+
+def make_datasets(X, y):
+    return {DIAG: {key: (X if key.startswith("X_") else y) for key in DATASET_KEYS}}
+
+def make_compact_X(n_rows=50):
+    # Same dtypes as make_full_dataset.get_compact_dtypes: items as float32, flags as uint8, decimals as float64
+    rng = np.random.RandomState(0)
+    items = rng.randint(0, 5, (n_rows, 3)).astype(np.float32)
+    items[rng.rand(n_rows, 3) < 0.2] = np.nan
+    X = pd.DataFrame(items, columns=["A,A_01", "A,A_02", "A,A_03"], index=np.arange(n_rows) * 3)
+    X.insert(1, "Basic_Demos,Age", rng.rand(n_rows) * 10)
+    X.insert(3, "A,A_01_WAS_MISSING", np.isnan(items[:, 0]).astype(np.uint8))
+    return X
+
+def is_memory_mapped(values):
+    # The array, or an array it is a view of, reads a memory mapped file
+    while values is not None:
+        if isinstance(values, (np.memmap, mmap.mmap)):
+            return True
+        values = values.base
+    return False
+
+def test_store_round_trip_and_memory_mapped_columns(tmp_path):
+    X = make_compact_X()
+    y = pd.Series(np.arange(len(X)) % 2, index=X.index, name=DIAG, dtype=np.uint8)
+    dataset_store.save_datasets_to_store(make_datasets(X, y), str(tmp_path) + "/")
+
+    datasets = dataset_store.load_datasets(str(tmp_path) + "/")
+    assert isinstance(datasets, dataset_store.StoredDatasets)
+    X_loaded, y_loaded = datasets[DIAG]["X_val"], datasets[DIAG]["y_val"]
+    pd.testing.assert_frame_equal(X_loaded, X)
+    pd.testing.assert_series_equal(y_loaded, y)
+
+    # Every column is a view of a memory mapped file, not a copy
+    assert all(is_memory_mapped(X_loaded[col].to_numpy()) for col in X_loaded.columns)
+    assert is_memory_mapped(y_loaded.to_numpy())
+    assert not is_memory_mapped(X["A,A_01"].to_numpy())
+
+def test_store_round_trip_of_nullable_columns(tmp_path):
+    X = make_compact_X()
+    X["A,A_04"] = pd.array([1, None] * (len(X) // 2), dtype="Int8")
+    y = pd.Series(np.arange(len(X)) % 2, index=X.index, name=DIAG, dtype=np.uint8)
+    dataset_store.save_datasets_to_store(make_datasets(X, y), str(tmp_path) + "/")
+
+    pd.testing.assert_frame_equal(dataset_store.load_datasets(str(tmp_path) + "/")[DIAG]["X_test"], X)
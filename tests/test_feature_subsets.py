@@ -0,0 +1,36 @@
+import warnings
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import make_pipeline
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler
+from sklearn.ensemble import RandomForestClassifier
+
+import models
+
+DIAG = "New Diag.Test"
+
+def make_datasets_with_nullable_ints():
+    rng = np.random.RandomState(0)
+    n_rows = 80
+    X = pd.DataFrame({f"A,A_{i:02d}": rng.randint(0, 5, n_rows) for i in range(6)}).astype("Int8")
+    X = X.mask(rng.rand(*X.shape) < 0.1) # pd.NA in Int8 columns
+    y = pd.Series((X["A,A_00"].fillna(0).to_numpy() + rng.randint(0, 3, n_rows) > 3).astype(int), name=DIAG)
+    return {DIAG: {"X_train_train": X, "y_train_train": y}}
+
+def make_rf_estimator():
+    return make_pipeline(SimpleImputer(missing_values=np.nan, strategy='median'), StandardScaler(), RandomForestClassifier(n_estimators=10, random_state=0))
+
+def test_mlxtend_rfe_then_sfs_on_nullable_ints(monkeypatch):
+    datasets = make_datasets_with_nullable_ints()
+    assert datasets[DIAG]["X_train_train"].isna().any().any()
+    monkeypatch.setitem(models.get_feature_subsets_from_sfs.__globals__, "SFS_ENGINE", "mlxtend")
+    monkeypatch.setitem(models.get_feature_subsets_from_sfs.__globals__, "DEBUG_MODE", True)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        feature_subsets, stopping_info = models.get_feature_subsets_from_rfe_then_sfs(DIAG, {DIAG: make_rf_estimator()}, datasets, 3)
+
+    assert sorted(feature_subsets) == [1, 2, 3]
+    assert all(len(feature_subsets[n]) == n for n in feature_subsets)
+    assert stopping_info["stopped_early"] is False
@@ -0,0 +1,80 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from data.helpers import make_full_dataset, column_catalog
+
+def test_compact_dtypes_are_exact_and_not_nullable(tmp_path):
+    data = pd.DataFrame({
+        "A,A_01": [0.0, 4.0, np.nan, 2.0], # Item
+        "A,A_Total": [-3.0, 120.0, 2.0**24, np.nan], # Integer score
+        "A,Large": [2.0**24 + 1, 1.0, 2.0, 3.0], # Not exact in float32
+        "Basic_Demos,Age": [7.123456789, 10.5, np.nan, 12.25],
+        "A,A_01_WAS_MISSING": [False, False, True, False],
+        "ID": ["a", "b", "c", "d"]})
+
+    compact_dtypes = make_full_dataset.get_compact_dtypes(data)
+    assert compact_dtypes == {"A,A_01": "float32", "A,A_Total": "float32", "A,Large": "float64", "Basic_Demos,Age": "float64", 
+                              "A,A_01_WAS_MISSING": "uint8", "ID": str(data["ID"].dtype)}
+
+    compact = data.astype(compact_dtypes)
+    assert not any(isinstance(dtype, pd.api.extensions.ExtensionDtype) for dtype in compact.drop(columns="ID").dtypes)
+    assert np.array_equal(compact.drop(columns="ID").to_numpy(dtype=float), data.drop(columns="ID").to_numpy(dtype=float), equal_nan=True)
+
+    csv_path = str(tmp_path / "item_lvl.csv")
+    make_full_dataset.export_dataset(compact, csv_path)
+    pd.testing.assert_frame_equal(make_full_dataset.read_dataset_csv(csv_path), compact)
+
+def write_loris_release(path):
+    # Small release: second row without ID, "." for missing values, admin and NIH reason columns, a row with an underscore 
+    #   in ID (its TRF questionnaire is dropped), an incomplete evaluation, an empty column and a column with values in the last rows only
+    rows = []
+    for i in range(30):
+        ID = f"NDAR{i:03d}" + ("_1" if i == 7 else "")
+        rows.append({"Identifiers,EID": ID, "Basic_Demos,EID": ID, "Basic_Demos,Age": 5 + i / 3, "Basic_Demos,Study_Site": 1,
+                     "SCQ,EID": ID if i % 4 else "", "SCQ,SCQ_01": str(i % 3) if i % 5 else ".", "SCQ,SCQ_Total": i * 2,
+                     "NIH_Scores,EID": ID, "NIH_Scores,NIH7_Incomplete_Reason": "refused" if i == 3 else "", "NIH_Scores,NIH7_Card": 100 + i,
+                     "TRF,EID": ID if i == 7 else "", "TRF,TRF_01": 1 if i == 7 else "", "Empty,Col": "", "Late,Col": 3 if i >= 25 else "",
+                     "Diagnosis_ClinicianConsensus,EID": "" if i in (7, 11) else ID, 
+                     "Diagnosis_ClinicianConsensus,DX_01": "No Diagnosis Given: Incomplete Eval" if i == 13 else "ADHD"})
+        if i == 7:
+            rows[-1] = {col: (value if col in ("Identifiers,EID", "TRF,EID", "TRF,TRF_01") else "") for col, value in rows[-1].items()}
+    release = pd.DataFrame([{col: "header" for col in rows[0]}] + rows)
+    release.to_csv(path, index=False)
+
+def test_chunked_cleaning_is_same_as_cleaning_all_rows(tmp_path):
+    path = str(tmp_path / "release.csv")
+    write_loris_release(path)
+    assessments = ["Basic_Demos", "SCQ", "NIH_Scores", "TRF", "Empty", "Late"]
+
+    full_wo_underscore = make_full_dataset.clean_loris_release(make_full_dataset.read_loris_release(path, assessments))
+    assert list(full_wo_underscore.columns) == ["Identifiers,EID", "Basic_Demos,EID", "Basic_Demos,Age", "SCQ,EID", "SCQ,SCQ_01", "SCQ,SCQ_Total", 
+                                               "NIH_Scores,EID", "NIH_Scores,NIH7_Card", "Late,Col", 
+                                               "Diagnosis_ClinicianConsensus,EID", "Diagnosis_ClinicianConsensus,DX_01", "ID"]
+    assert len(full_wo_underscore) == 27
+    assert full_wo_underscore["SCQ,SCQ_Total"].dtype == np.float32 and full_wo_underscore["Basic_Demos,Age"].dtype == np.float64
+
+    for chunksize in [4, 7, 30]:
+        chunked = make_full_dataset.clean_loris_release(make_full_dataset.read_loris_release(path, assessments, chunksize=chunksize))
+        pd.testing.assert_frame_equal(chunked, full_wo_underscore, check_dtype=False)
+        assert all(chunked[col].to_numpy(dtype=np.float64).tobytes() == full_wo_underscore[col].to_numpy(dtype=np.float64).tobytes() 
+                   for col in ["Basic_Demos,Age", "SCQ,SCQ_Total"])
+
+def test_separate_item_lvl_from_scale_scores_with_catalog():
+    # SRS until dropped; preg_symp, Diag. and markers added later; marker of a dropped DX column
+    columns = ["SRS,SRS_01", "SRS,SRS_Total", "SRS,SRS_Total_T", "SRS,SRS_AWR", "SRS,SRS_AWR_T", "SRS,SRS_01_WAS_MISSING", 
+               "SRS,SRS_AWR_T_WAS_MISSING", "SRS,SRS_Total_T_WAS_MISSING", "Diagnosis_ClinicianConsensus,DX_02_WAS_MISSING", "preg_symp", "Diag.ADHD"]
+    data = pd.DataFrame(np.zeros((2, len(columns))), columns=columns)
+    catalog = column_catalog.build_column_catalog(data.columns)
+
+    datasets = make_full_dataset.separate_item_lvl_from_scale_scores(data, catalog, ["SRS"])
+    item_lvl, total_scores, subscale_scores = make_full_dataset.remove_irrelavent_missing_markers(catalog, *datasets)
+
+    assert list(item_lvl.columns) == ["SRS,SRS_01", "SRS,SRS_01_WAS_MISSING", "preg_symp", "Diag.ADHD"]
+    assert list(total_scores.columns) == ["SRS,SRS_Total_T", "SRS,SRS_Total_T_WAS_MISSING", "preg_symp", "Diag.ADHD"]
+    assert list(subscale_scores.columns) == ["SRS,SRS_AWR_T", "SRS,SRS_AWR_T_WAS_MISSING", "preg_symp", "Diag.ADHD"]
+
+    # Catalogs are shared between callers
+    assert column_catalog.build_column_catalog(data.columns) is catalog
+    with pytest.raises(TypeError):
+        catalog["kind"]["preg_symp"] = "total"
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.pipeline import make_pipeline
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+
+import models
+
+def make_data():
+    rng = np.random.RandomState(0)
+    X = pd.DataFrame(rng.rand(60, 4), columns=[f"A,A_{i:02d}" for i in range(4)])
+    y = pd.Series((X["A,A_00"] + 0.3 * rng.rand(60) > 0.6).astype(int))
+    return X, y
+
+def test_rf_oob_search_with_all_candidates_failing():
+    X, y = make_data()
+    base_model = make_pipeline(SimpleImputer(strategy='median'), StandardScaler(), RandomForestClassifier(n_estimators=10, random_state=0))
+    grid = {"randomforestclassifier__max_features": ["not_a_max_features", "neither_is_this"]}
+
+    with pytest.raises(ValueError, match="All 2 candidates failed"):
+        models.get_best_rf_by_oob(base_model, grid, StratifiedKFold(n_splits=3), 2, X, y, n_jobs=1, random_state=0)
+
+def make_lr_model():
+    return make_pipeline(SimpleImputer(strategy='median'), StandardScaler(), LogisticRegression(solver="saga", max_iter=200))
+
+def test_lr_path_search_skips_failing_paths():
+    X, y = make_data()
+    # Paths with an unknown penalty fail on every fold
+    grid = {"logisticregression__C": [0.1, 1, 10], "logisticregression__penalty": ["l2", "not_a_penalty"]}
+
+    best_estimator, mean_score, sd_score = models.get_best_lr_on_c_paths(make_lr_model(), grid, StratifiedKFold(n_splits=3), 40, X, y, n_jobs=1, random_state=0)
+    assert best_estimator.get_params()["logisticregression__penalty"] == "l2"
+    assert not np.isnan(mean_score)
+
+    with pytest.raises(ValueError, match="All 10 candidates failed"):
+        models.get_best_lr_on_c_paths(make_lr_model(), {**grid, "logisticregression__penalty": ["not_a_penalty"]}, StratifiedKFold(n_splits=3), 10, X, y, n_jobs=1, random_state=0)